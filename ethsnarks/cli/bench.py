@@ -0,0 +1,146 @@
+import sys
+from timeit import Timer
+
+from ..field import FQ, SNARK_SCALAR_FIELD
+from ..jubjub import Point, JUBJUB_L, _etec_raw, _etec_add, _etec_double
+
+
+def _per_op(func, number):
+    """Average time of one call to `func`, in nanoseconds"""
+    return Timer(func).timeit(number) * 1e9 / number
+
+
+def _print_rows(title, header, rows):
+    print(title)
+    print("%-16s %14s %14s %9s" % header)
+    for name, slow, fast in rows:
+        print("%-16s %14.0f %14.0f %8.1fx" % (name, slow, fast, slow / fast))
+    print()
+
+
+def bench_field(number=100000):
+    """Per-operation cost of FQ objects against the raw integer kernel"""
+    q = SNARK_SCALAR_FIELD
+    a, b = FQ.random(), FQ.random()
+    an, bn = a.n, b.n
+    P = Point.generator().as_etec()
+    P2 = P.double()
+    rP, rP2 = _etec_raw(P), _etec_raw(P2)
+    cases = [
+        ("add", number, lambda: a + b, lambda: (an + bn) % q),
+        ("sub", number, lambda: a - b, lambda: (an - bn) % q),
+        ("mul", number, lambda: a * b, lambda: (an * bn) % q),
+        ("eq", number, lambda: a == b, lambda: an == bn),
+        ("inv", number // 100, lambda: a.inv(), lambda: pow(an, q - 2, q)),
+        ("etec_add", number // 10, lambda: P.add(P2), lambda: _etec_add(rP, rP2)),
+        ("etec_double", number // 10, lambda: P.double(), lambda: _etec_double(rP)),
+    ]
+    rows = [(name, _per_op(slow, n), _per_op(fast, n)) for name, n, slow, fast in cases]
+    _print_rows("field", ("operation", "FQ (ns)", "int (ns)", "speedup"), rows)
+
+
+def bench_poseidon(count=2000):
+    """Per-hash cost of `poseidon()` against `poseidon_batch()`"""
+    from ..poseidon import poseidon, DefaultParams
+    from ..poseidon.batch import poseidon_batch
+
+    inputs = [[FQ.random().n for _ in range(DefaultParams.t - 1)] for _ in range(count)]
+    poseidon_batch(inputs[:1])
+    slow = _per_op(lambda: [poseidon(_) for _ in inputs], 1) / count
+    fast = _per_op(lambda: poseidon_batch(inputs), 1) / count
+    rows = [("poseidon", slow / 1000, fast / 1000)]
+    header = ("operation", "scalar (us)", "batch (us)", "speedup")
+    _print_rows("poseidon (batch of %d)" % (count,), header, rows)
+
+
+def bench_mimc(number=200):
+    """Cost of MiMC against the uncached reference, and of MiMC-EdDSA signatures"""
+    from ..mimc import mimc, mimc_hash
+    from ..mimc.permutation import mimc_constants
+    from ..eddsa import MiMCEdDSA, EdDSASigner
+
+    q = SNARK_SCALAR_FIELD
+
+    def reference(x, k):
+        for c_i in list(mimc_constants()):
+            x = ((x + k + c_i) % q) ** 7 % q
+        return (x + k) % q
+
+    def reference_hash(xs, k=0):
+        for x_i in xs:
+            k = (k + x_i + reference(x_i, k)) % q
+        return k
+
+    x, k = FQ.random().n, FQ.random().n
+    key = FQ.random(JUBJUB_L)
+    signer = EdDSASigner(key, MiMCEdDSA)
+    signed = [signer.sign(FQ.random().n) for _ in range(16)]
+    A, sig, msg = signed[0]
+    n = number // 10
+    cases = [
+        ("mimc", number, lambda: reference(x, k), lambda: mimc(x, k)),
+        (
+            "mimc_hash",
+            number,
+            lambda: reference_hash([x, k]),
+            lambda: mimc_hash([x, k]),
+        ),
+        ("eddsa_sign", n, lambda: MiMCEdDSA.sign(msg, key), lambda: signer.sign(msg)),
+        (
+            "eddsa_verify",
+            n,
+            lambda: MiMCEdDSA.verify(A, sig, msg),
+            lambda: MiMCEdDSA.verify_batch(signed),
+        ),
+    ]
+    rows = [
+        (name, _per_op(slow, n) / 1000, _per_op(fast, n) / 1000)
+        for name, n, slow, fast in cases
+    ]
+    # The batch verifies every signature at once
+    rows[-1] = rows[-1][:2] + (rows[-1][2] / len(signed),)
+    header = ("operation", "before (us)", "after (us)", "speedup")
+    _print_rows("mimc", header, rows)
+
+
+def bench_merkle(count=1 << 12):
+    """Time to build a tree sequentially, and with increasing numbers of processes"""
+    from os import cpu_count
+    from ..merkletree import MerkleTree
+
+    leaves = [FQ.random().n for _ in range(count)]
+
+    def build(workers=None):
+        return lambda: MerkleTree.from_leaves(leaves, workers=workers)
+
+    sequential = _per_op(build(), 1) / 1e6
+    rows = []
+    workers = 2
+    while workers <= max(cpu_count() or 1, 2):
+        parallel = _per_op(build(workers), 1) / 1e6
+        rows.append(("workers=%d" % (workers,), sequential, parallel))
+        workers *= 2
+    header = ("build", "1 proc (ms)", "pool (ms)", "speedup")
+    _print_rows("merkle (%d leaves)" % (count,), header, rows)
+
+
+BENCHMARKS = dict(
+    field=bench_field, merkle=bench_merkle, mimc=bench_mimc, poseidon=bench_poseidon
+)
+
+
+def main(*names):
+    """Runs the named benchmarks, or all of them"""
+    for name in names or sorted(BENCHMARKS.keys()):
+        if name not in BENCHMARKS:
+            print("Unknown benchmark: " + name)
+            return 1
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == "__main__":
+    if "-h" in sys.argv[1:] or "--help" in sys.argv[1:]:
+        print("Usage: ethsnarks.cli.bench [%s ...]" % ("|".join(sorted(BENCHMARKS)),))
+        sys.exit(1)
+    sys.exit(main(*sys.argv[1:]))
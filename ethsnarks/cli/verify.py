@@ -1,13 +1,18 @@
+import os
 import sys
 import json
+import time
+import queue
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
 
-from ..verifier import VerifyingKey, Proof
+from ..verifier import Proof, load_prepared_key
 
 
 def main(vk_file, proof_file):
     """Verifies the proof.json using the vk.json"""
-    with open(vk_file, "r") as vk_handle:
-        vk = VerifyingKey.from_dict(json.load(vk_handle))
+    vk = load_prepared_key(vk_file)
     with open(proof_file, "r") as proof_handle:
         proof = Proof.from_dict(json.load(proof_handle))
     if not vk.verify(proof):
@@ -17,8 +22,186 @@ def main(vk_file, proof_file):
     return 0
 
 
+def _iter_proofs(source):
+    """
+    Yields `(name, json_data)` for every proof in a directory of .json files,
+    or a JSONL file with one proof per line ('-' reads from stdin)
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.endswith(".json"):
+                with open(os.path.join(source, name), "r") as handle:
+                    yield name, handle.read()
+        return
+    handle = sys.stdin if source == "-" else open(source, "r")
+    try:
+        for i, line in enumerate(handle):
+            if line.strip():
+                yield "%s:%d" % (source, i + 1), line
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+_WORKER_VK = None
+
+
+def _init_worker(vk):
+    global _WORKER_VK
+    _WORKER_VK = vk
+
+
+def _error(ex):
+    return "%s: %s" % (type(ex).__name__, ex)
+
+
+def _verify_one(vk, proof):
+    try:
+        return vk.verify(proof)
+    except Exception as ex:
+        return _error(ex)
+
+
+def _verify_chunk(chunk, vk=None):
+    """
+    Verify a list of `(name, json_data)` proofs with batched pairings, returns a
+    list of `(name, result)` where result is True, False or an error message
+    """
+    vk = vk or _WORKER_VK
+    results = [None] * len(chunk)
+    parsed, proofs = [], []
+    for i, (_, data) in enumerate(chunk):
+        try:
+            proofs.append(Proof.from_dict(json.loads(data)))
+            parsed.append(i)
+        except Exception as ex:
+            results[i] = _error(ex)
+    if proofs:
+        try:
+            checked = vk.verify_batch(proofs)
+        except Exception:
+            # One bad proof fails the whole batch, find it by checking each one
+            checked = [_verify_one(vk, _) for _ in proofs]
+        for i, result in zip(parsed, checked):
+            results[i] = result
+    return [(name, result) for (name, _), result in zip(chunk, results)]
+
+
+def _pool_results(pool, chunks, window):
+    """
+    Verify chunks in the process pool, yielding their results in order
+
+    The input is read and submitted by a separate thread with at most `window`
+    chunks waiting, so results are yielded as soon as they are ready instead
+    of after all of the input has been read.
+    """
+    futures = queue.Queue(window)
+
+    def submit():
+        try:
+            for chunk in chunks:
+                futures.put(pool.submit(_verify_chunk, chunk))
+        except BaseException as ex:
+            futures.put(ex)
+        futures.put(None)
+
+    threading.Thread(target=submit, daemon=True).start()
+    while True:
+        item = futures.get()
+        if item is None:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item.result()
+
+
+def verify_many(vk_file, source, workers=1, batch_size=16, out=sys.stdout):
+    """
+    Verifies every proof from `source` using the vk.json, printing one result
+    per line as they complete and throughput statistics to stderr at the end
+    """
+    vk = load_prepared_key(vk_file)
+    chunks = _chunks(_iter_proofs(source), batch_size)
+    counts = dict(OK=0, FAIL=0, ERROR=0)
+    start = time.time()
+    if workers > 1:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(vk,))
+        results = _pool_results(pool, chunks, 2 * workers)
+    else:
+        pool = None
+        results = (_verify_chunk(_, vk) for _ in chunks)
+    try:
+        for chunk_results in results:
+            for name, result in chunk_results:
+                if result is True:
+                    status = "OK"
+                elif result is False:
+                    status = "FAIL"
+                else:
+                    status = "ERROR"
+                    name = "%s %s" % (name, result)
+                counts[status] += 1
+                out.write("%s %s\n" % (status, name))
+            out.flush()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    elapsed = time.time() - start
+    total = sum(counts.values())
+    sys.stderr.write(
+        "%d proofs, %d ok, %d failed, %d errors in %.2fs (%.2f proofs/s)\n"
+        % (
+            total,
+            counts["OK"],
+            counts["FAIL"],
+            counts["ERROR"],
+            elapsed,
+            total / elapsed if elapsed else 0,
+        )
+    )
+    return 0 if total == counts["OK"] else 1
+
+
+def _main(args):
+    parser = argparse.ArgumentParser(
+        "ethsnarks.cli.verify",
+        description="Verify a proof.json, or a directory or JSONL file of proofs",
+    )
+    parser.add_argument("vk_file", metavar="vk.json")
+    parser.add_argument("proofs", metavar="proof.json|DIR|proofs.jsonl|-")
+    parser.add_argument(
+        "-j",
+        "--workers",
+        metavar="N",
+        type=int,
+        default=1,
+        help="number of processes for batch verification",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        metavar="N",
+        type=int,
+        default=16,
+        help="proofs combined into each batched pairing check",
+    )
+    opts = parser.parse_args(args)
+    proofs = opts.proofs
+    if proofs == "-" or os.path.isdir(proofs) or proofs.endswith(".jsonl"):
+        return verify_many(opts.vk_file, proofs, opts.workers, opts.batch)
+    return main(opts.vk_file, proofs)
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: ethsnarks.cli.verify <vk.json> <proof.json>")
-        sys.exit(1)
-    sys.exit(main(*sys.argv[1:]))
+    sys.exit(_main(sys.argv[1:]))
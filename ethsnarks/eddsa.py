@@ -1,11 +1,15 @@
 import math
 import bitstring
+from os import urandom
 from collections import namedtuple
 from hashlib import sha512
 
 from .field import FQ, SNARK_SCALAR_FIELD
-from .jubjub import Point, JUBJUB_L, JUBJUB_Q, JUBJUB_E
-from .pedersen import pedersen_hash_bytes, pedersen_hash_bits
+from .jubjub import Point, JUBJUB_L, JUBJUB_Q, JUBJUB_E, fixed_base_table
+from .jubjub import _ETEC_INFINITY, _etec_raw, _etec_add, _etec_double
+from .jubjub import _etec_neg, _etec_mult, _etec_multi_mult, _etec_eq, _etec_points
+from .pedersen import pedersen_hash_bytes, pedersen_hash_int
+from .pedersen import _BIT_REVERSE
 from .poseidon import poseidon_params, poseidon
 from .mimc import mimc_hash
 
@@ -109,6 +113,32 @@ class _SignatureScheme(object):
                 raise TypeError("Bad type for M: " + str(type(M)))
         return result
 
+    @classmethod
+    def to_int_bits(cls, *args):
+        """
+        The bits of `to_bits` as a `(value, nbits)` pair of integers, where the
+        first bit is the least significant bit of `value`
+        """
+        value, nbits = 0, 0
+        for M in args:
+            if isinstance(M, Point):
+                M_value, M_nbits = M.x.n, math.ceil(math.log2(M.x.m))
+            elif isinstance(M, FQ):
+                M_value, M_nbits = M.n, math.ceil(math.log2(M.m))
+            elif isinstance(M, (list, tuple)):
+                # Note: (list,tuple) must go *below* other class types to avoid type confusion
+                M_value, M_nbits = cls.to_int_bits(*M)
+            elif isinstance(M, bytes):
+                M_value = int.from_bytes(M.translate(_BIT_REVERSE), "little")
+                M_nbits = len(M) * 8
+            elif isinstance(M, bitstring.BitArray):
+                M_value, M_nbits = (M[::-1].uint if len(M) else 0), len(M)
+            else:
+                raise TypeError("Bad type for M: " + str(type(M)))
+            value |= M_value << nbits
+            nbits += M_nbits
+        return value, nbits
+
     @classmethod
     def prehash_message(cls, M):
         """
@@ -152,37 +182,29 @@ class _SignatureScheme(object):
     def B(cls):
         return Point.generator()
 
+    @classmethod
+    def B_mult(cls, scalar, B=None):
+        """
+        Multiply the base point by a scalar, using its precomputed fixed-base table
+        """
+        return fixed_base_table(B or cls.B()).mult(scalar)
+
     @classmethod
     def random_keypair(cls, B=None):
-        B = B or cls.B()
         k = FQ.random(JUBJUB_L)
-        A = B * k
+        A = cls.B_mult(k, B)
         return k, A
 
     @classmethod
     def sign(cls, msg, key, B=None):
-        if not isinstance(key, FQ):
-            raise TypeError("Invalid type for parameter k")
-        # Strict parsing ensures key is in the prime-order group
-        if key.n >= JUBJUB_L or key.n <= 0:
-            raise RuntimeError("Strict parsing of k failed")
-
-        B = B or cls.B()
-        A = B * key  # A = kB
-
-        M = cls.prehash_message(msg)
-        r = cls.hash_secret(key, M)  # r = H(k,M) mod L
-        R = B * r  # R = rB
-
-        t = cls.hash_public(
-            R, A, M
-        )  # Bind the message to the nonce, public key and message
-        S = (r + (key.n * t)) % JUBJUB_E  # r + (H(R,A,M) * k)
-
-        return SignedMessage(A, Signature(R, S), msg)
+        return EdDSASigner(key, cls, B).sign(msg)
 
     @classmethod
-    def verify(cls, A, sig, msg, B=None):
+    def _verify_sides(cls, A, sig, msg, B=None):
+        """
+        Both sides of the verification equation `S*B == R + H(R,A,M)*A`, as raw
+        extended coordinates
+        """
         if not isinstance(A, Point):
             A = Point(*A)
 
@@ -190,18 +212,85 @@ class _SignatureScheme(object):
             sig = Signature(*sig)
 
         R, S = sig
-        B = B or cls.B()
-        lhs = B * S
+        lhs = cls.B_mult(S, B)
 
         M = cls.prehash_message(msg)
-        rhs = R + (A * cls.hash_public(R, A, M))
-        return lhs == rhs
+        # R + (A * H(R,A,M)) stays in extended coordinates, avoiding a projection
+        h = cls.hash_public(R, A, M)
+        rhs = _etec_add(_etec_raw(R), _etec_mult(_etec_raw(A), h))
+        return _etec_raw(lhs), rhs
+
+    @classmethod
+    def verify(cls, A, sig, msg, B=None):
+        lhs, rhs = cls._verify_sides(A, sig, msg, B)
+        return _etec_eq(lhs, rhs)
+
+    @classmethod
+    def verify_cofactored(cls, A, sig, msg, B=None):
+        """
+        Verify with the cofactored equation `8*S*B == 8*R + 8*H(R,A,M)*A`
+
+        This is the check made by `verify_batch`. It differs from `verify` only
+        for signatures where A or R has a small-order component.
+        """
+        lhs, rhs = cls._verify_sides(A, sig, msg, B)
+        diff = _etec_add(lhs, _etec_neg(rhs))
+        diff = _etec_double(_etec_double(_etec_double(diff)))
+        return _etec_eq(diff, _ETEC_INFINITY)
+
+    @classmethod
+    def verify_batch(cls, items, B=None):
+        """
+        Verify many signatures with one random linear combination
+
+        Each item is a `SignedMessage` or an `(A, sig, msg)` tuple. With random
+        128-bit weights `z_i` every signature is accepted when:
+
+            8 * ((sum z_i*S_i)*B - sum z_i*R_i - sum (z_i*h_i)*A_i) == 0
+
+        The result for each item is that of `verify_cofactored`, whatever the
+        other items are. Because of the cofactor multiplication, a signature
+        which only differs from a valid one by a small-order component of A or
+        R is accepted here, where `verify` may reject it. Both agree for keys
+        and nonces in the prime-order subgroup, as produced by `sign`. When the
+        combined check fails every item is verified individually with the same
+        cofactored equation to find the bad ones.
+
+        Returns a list with the result for each item
+        """
+        items = [(_[0], _[1], _[2]) for _ in items]
+        if not items:
+            return []
+
+        S_sum = 0
+        points = []
+        scalars = []
+        for A, sig, msg in items:
+            if not isinstance(A, Point):
+                A = Point(*A)
+            if not isinstance(sig, Signature):
+                sig = Signature(*sig)
+            R, S = sig
+            h = cls.hash_public(R, A, cls.prehash_message(msg))
+            z = int.from_bytes(urandom(16), "little")
+            S_sum += z * S.n
+            points += [_etec_neg(_etec_raw(R)), _etec_neg(_etec_raw(A))]
+            scalars += [z, (z * h) % JUBJUB_L]
+
+        # B has prime order, the same is true of every term after the cofactor multiplication
+        result = _etec_raw(cls.B_mult(S_sum % JUBJUB_L, B))
+        result = _etec_add(result, _etec_multi_mult(points, scalars))
+        result = _etec_double(_etec_double(_etec_double(result)))
+        if _etec_eq(result, _ETEC_INFINITY):
+            return [True] * len(items)
+
+        return [cls.verify_cofactored(A, sig, msg, B) for A, sig, msg in items]
 
 
 class PureEdDSA(_SignatureScheme):
     @classmethod
     def hash_public(cls, *args, p13n=P13N_EDDSA_VERIFY_RAM):
-        return pedersen_hash_bits(p13n, cls.to_bits(*args)).x.n
+        return pedersen_hash_int(p13n, *cls.to_int_bits(*args)).x.n
 
 
 class EdDSA(PureEdDSA):
@@ -243,3 +332,60 @@ class PoseidonEdDSA(_SignatureScheme):
         )
         inputMsg = list(as_scalar(*args))
         return poseidon(inputMsg, PoseidonHashParams)
+
+
+class EdDSASigner(object):
+    """
+    Signs messages with a single key
+
+    The key is validated and the public key `A = kB` computed once, along with
+    the fixed-base table of `B`, so signing many messages with the same key only
+    costs the per-message work.
+    """
+
+    __slots__ = ("scheme", "key", "A", "_table")
+
+    def __init__(self, key, scheme=PoseidonEdDSA, B=None):
+        if not isinstance(key, FQ):
+            raise TypeError("Invalid type for parameter k")
+        # Strict parsing ensures key is in the prime-order group
+        if key.n >= JUBJUB_L or key.n <= 0:
+            raise RuntimeError("Strict parsing of k failed")
+        self.scheme = scheme
+        self.key = key
+        self._table = fixed_base_table(B or scheme.B())
+        self.A = self._table.mult(key)  # A = kB
+
+    def sign(self, msg):
+        scheme, key = self.scheme, self.key
+
+        M = scheme.prehash_message(msg)
+        r = scheme.hash_secret(key, M)  # r = H(k,M) mod L
+        R = self._table.mult(r)  # R = rB
+
+        t = scheme.hash_public(
+            R, self.A, M
+        )  # Bind the message to the nonce, public key and message
+        S = (r + (key.n * t)) % JUBJUB_E  # r + (H(R,A,M) * k)
+
+        return SignedMessage(self.A, Signature(R, S), msg)
+
+    def sign_many(self, messages):
+        """
+        Sign every message, returns a list of `SignedMessage`
+
+        Equivalent to calling `sign` for each message, but the nonce points are
+        converted to affine coordinates together with a single inversion.
+        """
+        messages = list(messages)
+        scheme, key, A = self.scheme, self.key, self.A
+        prehashed = [scheme.prehash_message(msg) for msg in messages]
+        nonces = [scheme.hash_secret(key, M) for M in prehashed]  # r = H(k,M) mod L
+        # Every R = rB is projected to affine coordinates with one shared inversion
+        points = _etec_points([self._table._mult_raw(r) for r in nonces])
+        result = []
+        for msg, M, r, R in zip(messages, prehashed, nonces, points):
+            t = scheme.hash_public(R, A, M)
+            S = (r + (key.n * t)) % JUBJUB_E
+            result.append(SignedMessage(A, Signature(R, S), msg))
+        return result
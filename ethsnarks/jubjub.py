@@ -21,8 +21,8 @@ from os import urandom
 from hashlib import sha256
 from collections import namedtuple
 
-from .field import FQ, SNARK_SCALAR_FIELD
-from .numbertheory import SquareRootError
+from .field import FQ, SNARK_SCALAR_FIELD, _fq_unchecked, _batch_inverse
+from .numbertheory import SquareRootError, square_root_mod_prime
 
 
 JUBJUB_Q = SNARK_SCALAR_FIELD
@@ -169,10 +169,7 @@ class AbstractCurveOps(object):
         return mult_naf_lut(self, scalar, window)
 
     def mult(self, scalar):
-        if isinstance(scalar, FQ):
-            if scalar.m not in [SNARK_SCALAR_FIELD, JUBJUB_E, JUBJUB_L]:
-                raise ValueError("Invalid field modulus")
-            scalar = scalar.n
+        scalar = _scalar_int(scalar)
         p = self
         a = self.infinity()
         i = 0
@@ -185,6 +182,220 @@ class AbstractCurveOps(object):
         return a
 
 
+def _scalar_int(scalar):
+    """
+	Convert a scalar to an integer, validating the modulus of field elements
+	"""
+    if isinstance(scalar, FQ):
+        if scalar.m not in [SNARK_SCALAR_FIELD, JUBJUB_E, JUBJUB_L]:
+            raise ValueError("Invalid field modulus")
+        return scalar.n
+    return int(scalar)
+
+
+# Integer-only arithmetic in extended twisted edwards coordinates
+#
+# Points are plain `(X, Y, T, Z)` tuples of integers modulo JUBJUB_Q, avoiding an FQ
+# allocation and type check for every field operation. The FQ based point classes
+# only wrap these at the API boundary.
+_ETEC_INFINITY = (0, 1, 0, 1)
+
+
+def _etec_raw(point):
+    p = point.as_etec()
+    return (p.x.n, p.y.n, p.t.n, p.z.n)
+
+
+def _etec_wrap(p):
+    return EtecPoint(*[_fq_unchecked(_) for _ in p])
+
+
+def _etec_affine(p):
+    """
+	(X : Y : T : Z) -> (X/Z, Y/Z), as a pair of integers
+	"""
+    q = JUBJUB_Q
+    inv_z = pow(p[3], q - 2, q)
+    return (p[0] * inv_z % q, p[1] * inv_z % q)
+
+
+def _etec_point(p):
+    x, y = _etec_affine(p)
+    return Point(_fq_unchecked(x), _fq_unchecked(y))
+
+
+def _etec_affine_batch(points):
+    """
+	Project many raw points to affine `(x, y)` integer pairs, sharing one
+	inversion between all of the Z coordinates
+	"""
+    q = JUBJUB_Q
+    inverses = _batch_inverse([p[3] for p in points], q)
+    return [
+        (p[0] * inv_z % q, p[1] * inv_z % q) for p, inv_z in zip(points, inverses)
+    ]
+
+
+def _etec_points(points):
+    return [
+        Point(_fq_unchecked(x), _fq_unchecked(y)) for x, y in _etec_affine_batch(points)
+    ]
+
+
+def _etec_neg(p):
+    q = JUBJUB_Q
+    return ((-p[0]) % q, p[1], (-p[2]) % q, p[3])
+
+
+def _etec_eq(p1, p2):
+    """
+	Compare two points for equality without projecting them to affine coordinates
+	"""
+    q = JUBJUB_Q
+    if p1[3] == 0 or p2[3] == 0:
+        return False
+    return (p1[0] * p2[3] - p2[0] * p1[3]) % q == 0 and (
+        p1[1] * p2[3] - p2[1] * p1[3]
+    ) % q == 0
+
+
+def _etec_add(p1, p2):
+    """
+	3.1 Unified addition in ε^e, see `EtecPoint.add`
+	"""
+    if p1 == _ETEC_INFINITY:
+        return p2
+    q = JUBJUB_Q
+    x1, y1, t1, z1 = p1
+    x2, y2, t2, z2 = p2
+    x1x2 = x1 * x2 % q
+    y1y2 = y1 * y2 % q
+    dt1t2 = JUBJUB_D * t1 * t2 % q
+    z1z2 = z1 * z2 % q
+    e = ((x1 + y1) * (x2 + y2) - x1x2 - y1y2) % q
+    f = z1z2 - dt1t2
+    g = z1z2 + dt1t2
+    h = y1y2 - JUBJUB_A * x1x2
+    return (e * f % q, g * h % q, e * h % q, f * g % q)
+
+
+def _etec_double(p):
+    """
+	dbl-2008-hwcd, see `EtecPoint.double`
+	"""
+    if p == _ETEC_INFINITY:
+        return p
+    q = JUBJUB_Q
+    x, y, _, z = p
+    a = x * x % q
+    b = y * y % q
+    c = 2 * z * z % q
+    d = JUBJUB_A * a % q
+    e = ((x + y) * (x + y) - a - b) % q
+    g = d + b
+    f = g - c
+    h = d - b
+    return (e * f % q, g * h % q, e * h % q, f * g % q)
+
+
+def _etec_naf_window(p, width):
+    """
+	Odd multiples of a point, and their negatives, for use with w-NAF multiplication
+	"""
+    window = {1: p, -1: _etec_neg(p)}
+    if width > 2:
+        p2 = _etec_double(p)
+        odd = p
+        for n in range(3, 1 << (width - 1), 2):
+            odd = _etec_add(odd, p2)
+            window[n] = odd
+            window[-n] = _etec_neg(odd)
+    return window
+
+
+def _etec_mult(p, scalar, width=4):
+    """
+	Multiply using windowed NAF, entirely in extended coordinates
+	"""
+    window = _etec_naf_window(p, width)
+    result = _ETEC_INFINITY
+    for k_i in wNAF(scalar, width):
+        result = _etec_double(result)
+        if k_i:
+            result = _etec_add(result, window[k_i])
+    return result
+
+
+# Above this many points Pippenger's bucket method beats Straus' interleaving
+MSM_PIPPENGER_THRESHOLD = 96
+
+
+def _etec_straus(points, scalars, width=4):
+    """
+	Straus' interleaved multi-scalar multiplication: sum(s_i * P_i)
+
+	The w-NAF digits of every scalar are processed together, so all of the points
+	share a single chain of doublings.
+	"""
+    windows = [_etec_naf_window(p, width) for p in points]
+    nafs = [wNAF(s, width)[::-1] for s in scalars]
+    result = _ETEC_INFINITY
+    for i in reversed(range(max([len(_) for _ in nafs], default=0))):
+        result = _etec_double(result)
+        for naf, window in zip(nafs, windows):
+            if i < len(naf) and naf[i]:
+                result = _etec_add(result, window[naf[i]])
+    return result
+
+
+def _etec_pippenger(points, scalars, c=None):
+    """
+	Pippenger's bucket method: sum(s_i * P_i)
+
+	For each c-bit window every point is added into the bucket for its digit,
+	the buckets are then summed with a running sum so that bucket `j` is counted
+	`j` times. The cost is about (nbits / c) * (N + 2^(c+1)) additions.
+	"""
+    if c is None:
+        c = max(2, len(points).bit_length() - 2)
+    nbits = max([_.bit_length() for _ in scalars], default=0)
+    mask = (1 << c) - 1
+    result = _ETEC_INFINITY
+    for shift in reversed(range(0, nbits, c)):
+        for _ in range(c):
+            result = _etec_double(result)
+        buckets = [_ETEC_INFINITY] * (mask + 1)
+        for p, s in zip(points, scalars):
+            digit = (s >> shift) & mask
+            if digit:
+                buckets[digit] = _etec_add(buckets[digit], p)
+        running = _ETEC_INFINITY
+        window_sum = _ETEC_INFINITY
+        for bucket in reversed(buckets[1:]):
+            if bucket != _ETEC_INFINITY:
+                running = _etec_add(running, bucket)
+            window_sum = _etec_add(window_sum, running)
+        result = _etec_add(result, window_sum)
+    return result
+
+
+def _etec_multi_mult(points, scalars):
+    """
+	Multi-scalar multiplication, picking the algorithm by the number of points
+	"""
+    if len(points) != len(scalars):
+        raise ValueError("Number of points and scalars differ")
+    points = list(points)
+    scalars = list(scalars)
+    for i, s in enumerate(scalars):
+        if s < 0:
+            points[i] = _etec_neg(points[i])
+            scalars[i] = -s
+    if len(points) > MSM_PIPPENGER_THRESHOLD:
+        return _etec_pippenger(points, scalars)
+    return _etec_straus(points, scalars)
+
+
 class Point(AbstractCurveOps, namedtuple("_Point", ("x", "y"))):
     def __str__(self):
         return " ".join([str(_) for _ in self])
@@ -215,7 +426,8 @@ class Point(AbstractCurveOps, namedtuple("_Point", ("x", "y"))):
         """
 		y^2 = ((a * x^2) / (d * x^2 - 1)) - (1 / (d * x^2 - 1))
 
-		For every x coordinate, there are two possible points: (x, y) and (x, -y)
+		For every x coordinate, there are two possible points: (x, y) and (x, -y),
+		the one returned is that with the smaller y as an integer modulo q
 		"""
         assert isinstance(x, FQ)
         assert x.m == JUBJUB_Q
@@ -224,6 +436,8 @@ class Point(AbstractCurveOps, namedtuple("_Point", ("x", "y"))):
         dxsqm1 = (JUBJUB_D * xsq - 1).inv()
         ysq = dxsqm1 * (ax2 - 1)
         y = ysq.sqrt()
+        if y.n > (-y).n:
+            y = -y
         return cls(x, y)
 
     @classmethod
@@ -321,6 +535,14 @@ class Point(AbstractCurveOps, namedtuple("_Point", ("x", "y"))):
     def as_point(self):
         return self
 
+    def mult(self, scalar):
+        """
+		Lift to extended coordinates and multiply using w-NAF there, the result is
+		projected back to affine coordinates with a single inversion.
+		"""
+        scalar = _scalar_int(scalar)
+        return _etec_point(_etec_mult(_etec_raw(self), scalar))
+
     def neg(self):
         """
 		Twisted Edwards Curves, BBJLP-2008, section 2 pg 2
@@ -347,11 +569,25 @@ class Point(AbstractCurveOps, namedtuple("_Point", ("x", "y"))):
         assert isinstance(other, Point)
         if self.x == 0 and self.y == 0:
             return other
-        (u1, v1) = (self.x, self.y)
-        (u2, v2) = (other.x, other.y)
-        u3 = (u1 * v2 + v1 * u2) / (FQ.one() + JUBJUB_D * u1 * u2 * v1 * v2)
-        v3 = (v1 * v2 - JUBJUB_A * u1 * u2) / (FQ.one() - JUBJUB_D * u1 * u2 * v1 * v2)
-        return Point(u3, v3)
+        q = JUBJUB_Q
+        (u1, v1) = (self.x.n, self.y.n)
+        (u2, v2) = (other.x.n, other.y.n)
+        u1u2 = u1 * u2 % q
+        v1v2 = v1 * v2 % q
+        du1u2v1v2 = JUBJUB_D * u1u2 * v1v2 % q
+        u3_num = u1 * v2 + v1 * u2
+        v3_num = v1v2 - JUBJUB_A * u1u2
+        u3_den = (1 + du1u2v1v2) % q
+        v3_den = (1 - du1u2v1v2) % q
+        # Both denominators are inverted with a single exponentiation
+        inv = pow(u3_den * v3_den, q - 2, q)
+        if inv != 0:
+            u3 = u3_num * v3_den * inv % q
+            v3 = v3_num * u3_den * inv % q
+        else:
+            u3 = u3_num * pow(u3_den, q - 2, q) % q
+            v3 = v3_num * pow(v3_den, q - 2, q) % q
+        return Point(_fq_unchecked(u3), _fq_unchecked(v3))
 
     @staticmethod
     def infinity():
@@ -597,8 +833,7 @@ class EtecPoint(AbstractCurveOps, namedtuple("_EtecPoint", ("x", "y", "t", "z"))
 
 			(X : Y : T : Z) -> (X/Z, Y/Z)
 		"""
-        inv_z = self.z.inv()
-        return Point(self.x * inv_z, self.y * inv_z)
+        return _etec_point(_etec_raw(self))
 
     def as_proj(self):
         """
@@ -613,6 +848,19 @@ class EtecPoint(AbstractCurveOps, namedtuple("_EtecPoint", ("x", "y", "t", "z"))
     def infinity():
         return EtecPoint(FQ(0), FQ(1), FQ(0), FQ(1))
 
+    @staticmethod
+    def multi_scalar_mult(points, scalars):
+        """
+		Compute sum(scalars[i] * points[i]) with one shared computation
+
+		Uses Straus' interleaved w-NAF for small numbers of points, and Pippenger's
+		bucket method above MSM_PIPPENGER_THRESHOLD points. The points may be of any
+		of the coordinate systems, the result is an EtecPoint.
+		"""
+        points = [_etec_raw(_) for _ in points]
+        scalars = [_scalar_int(_) for _ in scalars]
+        return _etec_wrap(_etec_multi_mult(points, scalars))
+
     def neg(self):
         """
 		Twisted Edwards Curves Revisited - HWCD, pg 5, section 3
@@ -630,19 +878,7 @@ class EtecPoint(AbstractCurveOps, namedtuple("_EtecPoint", ("x", "y", "t", "z"))
 		"""
         if self == self.infinity():
             return self.infinity()
-        a = self.x * self.x
-        b = self.y * self.y
-        t0 = self.z * self.z
-        c = t0 * 2
-        d = JUBJUB_A * a
-        t1 = self.x + self.y
-        t2 = t1 * t1
-        t3 = t2 - a
-        e = t3 - b
-        g = d + b
-        f = g - c
-        h = d - b
-        return EtecPoint(e * f, g * h, e * h, f * g)
+        return _etec_wrap(_etec_double(_etec_raw(self)))
 
     def add(self, other):
         """
@@ -655,16 +891,84 @@ class EtecPoint(AbstractCurveOps, namedtuple("_EtecPoint", ("x", "y", "t", "z"))
         assert self.z != 0
         assert other.z != 0
 
-        x1x2 = self.x * other.x
-        y1y2 = self.y * other.y
-        dt1t2 = (JUBJUB_D * self.t) * other.t
-        z1z2 = self.z * other.z
-        e = ((self.x + self.y) * (other.x + other.y)) - x1x2 - y1y2
-        f = z1z2 - dt1t2
-        g = z1z2 + dt1t2
-        h = y1y2 - (JUBJUB_A * x1x2)
+        return _etec_wrap(_etec_add(_etec_raw(self), _etec_raw(other)))
 
-        return EtecPoint(e * f, g * h, e * h, f * g)
+
+def normalize_batch(points):
+    """
+	Convert many points to affine coordinates with a single field inversion
+
+	Projective and extended points cost 3 multiplications each for the shared
+	inversion plus 2 to scale X and Y, instead of one exponentiation per point.
+	Returns a list of `Point`, in the same order.
+	"""
+    points = list(points)
+    raw = []
+    for p in points:
+        if isinstance(p, ProjPoint):
+            if p.z == 0:
+                raise ValueError("Point at infinity has no affine coordinates")
+            raw.append((p.x.n, p.y.n, 0, p.z.n))
+        elif isinstance(p, EtecPoint):
+            if p.z == 0:
+                raise ValueError("Point at infinity has no affine coordinates")
+            raw.append(_etec_raw(p))
+        else:
+            raw.append(_etec_raw(p.as_point()))
+    return _etec_points(raw)
+
+
+def compress_many(points, out=None):
+    """
+	Compress many points into one buffer of consecutive 32 byte encodings
+
+	The encodings are written into `out` when given, which must be a writable
+	buffer of at least 32 bytes per point, otherwise into a new bytearray.
+	Points not in affine coordinates are normalized together first.
+	"""
+    points = list(points)
+    if not all(type(p) is Point for p in points):
+        points = normalize_batch(points)
+    if out is None:
+        out = bytearray(32 * len(points))
+    view = memoryview(out)
+    if len(view) < 32 * len(points):
+        raise ValueError("Output buffer too small")
+    for i, p in enumerate(points):
+        value = p.y.n | ((p.x.n & 1) << 255)
+        view[i * 32 : (i + 1) * 32] = value.to_bytes(32, "little")
+    return out
+
+
+def decompress_many(buffer):
+    """
+	Decompress a contiguous buffer of 32 byte point encodings, as produced by
+	`compress_many` or concatenated results of `Point.compress`
+
+	Equivalent to `Point.decompress` for each encoding, but the denominators of
+	`x^2 = (y^2 - 1) / (d*y^2 - a)` are inverted together. Raises SquareRootError
+	if any encoding isn't a point on the curve.
+	"""
+    view = memoryview(buffer)
+    if len(view) % 32 != 0:
+        raise ValueError("Invalid input length for decompression")
+    q = JUBJUB_Q
+    mask = (1 << 255) - 1
+    ys, signs, ysqs = [], [], []
+    for i in range(0, len(view), 32):
+        y = int.from_bytes(view[i : i + 32], "little")
+        signs.append(y >> 255)
+        y = (y & mask) % q
+        ys.append(y)
+        ysqs.append(y * y % q)
+    inverses = _batch_inverse([(JUBJUB_D * _ - JUBJUB_A) % q for _ in ysqs], q)
+    result = []
+    for y, sign, ysq, inv in zip(ys, signs, ysqs, inverses):
+        x = square_root_mod_prime((ysq - 1) * inv % q, q)
+        if (x & 1) != sign:
+            x = (-x) % q
+        result.append(Point(_fq_unchecked(x), _fq_unchecked(y)))
+    return result
 
 
 def wNAF(k, width=2):
@@ -732,3 +1036,67 @@ def mult_naf_lut(point, scalar, width=2):
         if p is not None:
             a = a.add(p)
     return a
+
+
+class FixedBaseTable(object):
+    """
+	Precomputed multiples of a fixed point, used for scalar multiplication without doublings
+
+	The scalar is split into `width`-bit windows, row `i` of the table holds
+	`j * 2^(width*i) * P` for every window value `j`, in extended coordinates.
+	Multiplication is then one table lookup and one addition per non-zero window,
+	with a single projection back to affine coordinates at the end.
+	"""
+
+    def __init__(self, point, width=4, nbits=JUBJUB_E.bit_length()):
+        assert width > 0
+        self.point = point.as_point()
+        self.width = width
+        self.nbits = nbits
+        self.rows = []
+        row_base = _etec_raw(self.point)
+        for _ in range((nbits + width - 1) // width):
+            row = [_ETEC_INFINITY, row_base]
+            for j in range(2, 1 << width):
+                row.append(_etec_add(row[j - 1], row_base))
+            self.rows.append(row)
+            row_base = _etec_add(row[-1], row_base)
+
+    def _mult_raw(self, scalar):
+        scalar = _scalar_int(scalar)
+        if scalar < 0:
+            raise ValueError("Negative scalar")
+        if scalar.bit_length() > self.nbits:
+            return _etec_mult(_etec_raw(self.point), scalar)
+        mask = (1 << self.width) - 1
+        result = _ETEC_INFINITY
+        for row in self.rows:
+            if scalar == 0:
+                break
+            window = scalar & mask
+            if window:
+                result = _etec_add(result, row[window])
+            scalar >>= self.width
+        return result
+
+    def mult_etec(self, scalar):
+        return _etec_wrap(self._mult_raw(scalar))
+
+    def mult(self, scalar):
+        return _etec_point(self._mult_raw(scalar))
+
+
+_FIXED_BASE_TABLES = dict()
+
+
+def fixed_base_table(point, width=4):
+    """
+	Return the precomputed table for a base point, it is built on first use
+	and then reused for every multiplication of that point.
+	"""
+    point = point.as_point()
+    key = (point.x.n, point.y.n, width)
+    table = _FIXED_BASE_TABLES.get(key)
+    if table is None:
+        table = _FIXED_BASE_TABLES[key] = FixedBaseTable(point, width)
+    return table
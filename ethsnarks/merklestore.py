@@ -0,0 +1,204 @@
+# Copyright (c) 2018-2019 HarryR
+# License: LGPL-3.0+
+
+import mmap
+import struct
+
+
+"""
+Disk-backed storage for the levels of a `MerkleTree`
+
+Every node is stored as a fixed-width 32 byte big-endian integer in a memory-mapped
+file, with one contiguous region per level:
+
+    header:   magic, width, depth, n_items, sparse, then the item count of each level
+    level 0:  n_items nodes
+    level 1:  n_items / width nodes
+    ...
+    level N:  1 node (the root)
+
+Updates are written in place, and the item counts are only increased after the
+nodes they cover are written. Several processes can open the same file read-only
+and serve proofs while one process appends to it.
+"""
+
+
+NODE_BYTES = 32
+
+_MAGIC = b"ETHSMKT1"
+_HEADER = struct.Struct(">8sIIQI")
+_COUNT = struct.Struct(">Q")
+
+
+def tree_depth(n_items, width):
+    """
+    Number of levels above the leaves, the largest `depth` with
+    `width ** depth <= n_items`, computed without floating point rounding
+    """
+    depth = 0
+    while width ** (depth + 1) <= n_items:
+        depth += 1
+    return depth
+
+
+class MmapLevel(object):
+    """
+    List-like sequence of integers stored in one level region of a `MmapNodeStore`
+    """
+
+    __slots__ = ("_mm", "_count_offset", "_offset", "_capacity")
+
+    def __init__(self, mm, count_offset, offset, capacity):
+        self._mm = mm
+        self._count_offset = count_offset
+        self._offset = offset
+        self._capacity = capacity
+
+    def __len__(self):
+        return _COUNT.unpack_from(self._mm, self._count_offset)[0]
+
+    def _set_len(self, count):
+        _COUNT.pack_into(self._mm, self._count_offset, count)
+
+    def _position(self, index):
+        count = len(self)
+        if index < 0:
+            index += count
+        if index < 0 or index >= count:
+            raise IndexError("Level index out of range")
+        return self._offset + (index * NODE_BYTES)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("Only contiguous slices are supported")
+            data = self._mm[
+                self._offset + (start * NODE_BYTES) : self._offset + (stop * NODE_BYTES)
+            ]
+            return [
+                int.from_bytes(data[i : i + NODE_BYTES], "big")
+                for i in range(0, len(data), NODE_BYTES)
+            ]
+        pos = self._position(index)
+        return int.from_bytes(self._mm[pos : pos + NODE_BYTES], "big")
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            # Only replacing existing nodes is supported, the count is unchanged
+            start, stop, step = index.indices(len(self))
+            if step != 1 or len(value) != stop - start:
+                raise ValueError("Only same-length contiguous slices are supported")
+            data = b"".join(_.to_bytes(NODE_BYTES, "big") for _ in value)
+            pos = self._offset + (start * NODE_BYTES)
+            self._mm[pos : pos + len(data)] = data
+            return
+        pos = self._position(index)
+        self._mm[pos : pos + NODE_BYTES] = value.to_bytes(NODE_BYTES, "big")
+
+    def __delitem__(self, index):
+        # Only truncation is supported, levels are never shortened by `MerkleTree`
+        if not isinstance(index, slice) or index.stop is not None or index.step:
+            raise ValueError("Only truncation of a level is supported")
+        start, _, _ = index.indices(len(self))
+        if start < len(self):
+            self._set_len(start)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __contains__(self, value):
+        try:
+            self.index(value)
+        except ValueError:
+            return False
+        return True
+
+    def index(self, value):
+        if not isinstance(value, int) or not (0 <= value < (1 << (NODE_BYTES * 8))):
+            raise ValueError("%r is not in level" % (value,))
+        needle = value.to_bytes(NODE_BYTES, "big")
+        end = self._offset + (len(self) * NODE_BYTES)
+        pos = self._mm.find(needle, self._offset, end)
+        while pos != -1:
+            if (pos - self._offset) % NODE_BYTES == 0:
+                return (pos - self._offset) // NODE_BYTES
+            pos = self._mm.find(needle, pos + 1, end)
+        raise ValueError("%r is not in level" % (value,))
+
+    def append(self, value):
+        self.extend([value])
+
+    def extend(self, values):
+        data = b"".join(_.to_bytes(NODE_BYTES, "big") for _ in values)
+        count = len(self)
+        n_values = len(data) // NODE_BYTES
+        if count + n_values > self._capacity:
+            raise RuntimeError("Level Full")
+        pos = self._offset + (count * NODE_BYTES)
+        self._mm[pos : pos + len(data)] = data
+        self._set_len(count + n_values)
+
+
+class MmapNodeStore(object):
+    """
+    Memory-mapped file holding every level of a Merkle tree
+
+    Use `create` to make a new file, or `open` to re-open an existing one without
+    reading or re-hashing any of its contents.
+    """
+
+    def __init__(self, handle, readonly):
+        self._handle = handle
+        access = mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE
+        self._mm = mmap.mmap(handle.fileno(), 0, access=access)
+        magic, width, depth, n_items, sparse = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError("Not a Merkle tree node store")
+        self.width = width
+        self.depth = depth
+        self.n_items = n_items
+        self.sparse = bool(sparse)
+        self.readonly = readonly
+        self.levels = []
+        offset = self._data_offset(depth)
+        capacity = n_items
+        for level in range(depth + 1):
+            count_offset = _HEADER.size + (level * _COUNT.size)
+            self.levels.append(MmapLevel(self._mm, count_offset, offset, capacity))
+            offset += capacity * NODE_BYTES
+            capacity //= width
+        if offset > len(self._mm):
+            raise ValueError("Truncated Merkle tree node store")
+
+    @staticmethod
+    def _data_offset(depth):
+        return _HEADER.size + ((depth + 1) * _COUNT.size)
+
+    @classmethod
+    def create(cls, filename, n_items, width=2, sparse=False):
+        """
+        Create a new, empty, store for a tree of `n_items` leaves
+        """
+        depth = tree_depth(n_items, width)
+        if width ** depth != n_items:
+            raise ValueError("Number of items must be a power of the width")
+        n_nodes = sum(n_items // (width ** _) for _ in range(depth + 1))
+        size = cls._data_offset(depth) + (n_nodes * NODE_BYTES)
+        with open(filename, "wb") as handle:
+            handle.write(_HEADER.pack(_MAGIC, width, depth, n_items, int(sparse)))
+            handle.truncate(size)
+        return cls.open(filename)
+
+    @classmethod
+    def open(cls, filename, readonly=False):
+        return cls(open(filename, "rb" if readonly else "r+b"), readonly)
+
+    def flush(self):
+        if not self.readonly:
+            self._mm.flush()
+
+    def close(self):
+        self.flush()
+        self._mm.close()
+        self._handle.close()
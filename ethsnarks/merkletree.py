@@ -1,13 +1,15 @@
 # Copyright (c) 2018-2019 HarryR
 # License: LGPL-3.0+
 
+import bisect
 import hashlib
-import math
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 from .poseidon import poseidon, DefaultParams as poseidon_DefaultParams
 from .mimc import mimc_hash
 from .field import FQ, SNARK_SCALAR_FIELD
+from .merklestore import MmapNodeStore, tree_depth
 
 
 class MerkleProof(
@@ -22,6 +24,105 @@ class MerkleProof(
         return root == item
 
 
+class MerkleMultiProof(
+    namedtuple(
+        "_MerkleMultiProof", ("leaves", "indices", "nodes", "hasher", "width", "depth")
+    )
+):
+    """
+    Proof for many leaves of the same tree
+
+    Sibling nodes shared between the paths of several leaves, or which can be
+    computed from other leaves in the proof, are only included once. `nodes`
+    holds the remaining siblings, level by level, in order of their offset.
+    """
+
+    @classmethod
+    def from_proofs(cls, proofs):
+        """
+        Combine independent `MerkleProof`s from the same tree into a multiproof
+        """
+        if not proofs:
+            raise ValueError("No proofs")
+        hasher, width = proofs[0].hasher, proofs[0].width
+        depth = len(proofs[0].path)
+        leaves = dict()
+        siblings = [dict() for _ in range(depth)]
+        for proof in proofs:
+            if proof.width != width or len(proof.path) != depth:
+                raise ValueError("Proofs are not from the same tree")
+            index = sum(
+                bit * (width ** level) for level, bit in enumerate(proof.address)
+            )
+            if leaves.setdefault(index, proof.leaf) != proof.leaf:
+                raise ValueError("Conflicting leaves for index %d" % (index,))
+            for level, items in enumerate(proof.path):
+                items = items if isinstance(items, list) else [items]
+                node_start = index - (index % width)
+                offsets = [
+                    _ for _ in range(node_start, node_start + width) if _ != index
+                ]
+                for offset, item in zip(offsets, items):
+                    if siblings[level].setdefault(offset, item) != item:
+                        raise ValueError("Conflicting proofs at offset %d" % (offset,))
+                index //= width
+        indices = sorted(leaves)
+        nodes = list()
+        for level, known in enumerate(_multiproof_levels(indices, width, depth)):
+            nodes += [siblings[level][_] for _ in _multiproof_siblings(known, width)]
+        return cls([leaves[_] for _ in indices], indices, nodes, hasher, width, depth)
+
+    def verify(self, root):
+        """
+        Re-construct the root, hashing each node on the paths at most once
+        """
+        if len(self.leaves) != len(self.indices) or not self.indices:
+            return False
+        known = dict(zip(self.indices, self.leaves))
+        if len(known) != len(self.indices):
+            return False
+        nodes = iter(self.nodes)
+        width = self.width
+        for depth in range(self.depth):
+            parents = dict()
+            for parent in sorted(set(_ // width for _ in known)):
+                node_items = list()
+                for offset in range(parent * width, (parent + 1) * width):
+                    item = known.get(offset)
+                    if item is None:
+                        item = next(nodes, None)
+                        if item is None:
+                            return False
+                    node_items.append(item)
+                parents[parent] = self.hasher.hash_node(depth, *node_items)
+            known = parents
+        # Every supplied node must have been used
+        if next(nodes, None) is not None:
+            return False
+        return list(known.items()) == [(0, root)]
+
+
+def _multiproof_levels(indices, width, depth):
+    """
+    Offsets of the nodes on each level which can be computed from the leaves
+    """
+    known = sorted(set(indices))
+    for _ in range(depth):
+        yield known
+        known = sorted(set(_ // width for _ in known))
+
+
+def _multiproof_siblings(known, width):
+    """
+    Offsets of the siblings which must be supplied to hash the parents of `known`
+    """
+    known_set = set(known)
+    for parent in sorted(set(_ // width for _ in known)):
+        for offset in range(parent * width, (parent + 1) * width):
+            if offset not in known_set:
+                yield offset
+
+
 class Abstract_MerkleHasher(object):
     def unique(self, depth, index):
         """
@@ -83,6 +184,58 @@ class MerkleHasher_Poseidon(Abstract_MerkleHasher):
 DEFAULT_HASHER = MerkleHasher_MiMC
 
 
+def _write_level(level, start, nodes):
+    """
+    Store `nodes` from offset `start` of a level, replacing the existing nodes
+    in place then appending the rest
+
+    The level is never shortened while it is being updated, so readers sharing
+    a `MmapNodeStore` don't see the count drop below the nodes they can read.
+    """
+    n_replaced = min(max(len(level) - start, 0), len(nodes))
+    if n_replaced:
+        level[start : start + n_replaced] = nodes[:n_replaced]
+    level.extend(nodes[n_replaced:])
+    if len(level) > start + len(nodes):
+        del level[start + len(nodes) :]
+
+
+def _hash_level(hasher, width, depth, items, offset, defaults=None):
+    """
+    Hash consecutive nodes of a level, starting at the `offset` of `items[0]`
+    which must be a multiple of `width`.
+
+    The last node is filled in with placeholders, or the level's default value,
+    if `items` doesn't cover all of it.
+    """
+    out = []
+    for i in range(0, len(items), width):
+        node_items = items[i : i + width]
+        if len(node_items) < width:
+            start = offset + i + len(node_items)
+            if defaults is not None:
+                node_items += [defaults[depth]] * (width - len(node_items))
+            else:
+                node_items += [
+                    hasher.unique(depth, _) for _ in range(start, offset + i + width)
+                ]
+        out.append(hasher.hash_node(depth, *node_items))
+    return out
+
+
+def _hash_subtree(hasher, width, height, items, offset, defaults=None):
+    """
+    Hash the `height` levels above a run of leaves starting at `offset`, which
+    must be a multiple of `width**height`. Returns the nodes of each level.
+    """
+    levels = []
+    for depth in range(height):
+        items = _hash_level(hasher, width, depth, items, offset, defaults)
+        offset //= width
+        levels.append(items)
+    return levels
+
+
 class MerkleTree(object):
     """
     With a tree of depth 2 and width 4, contains 16 items:
@@ -104,59 +257,235 @@ class MerkleTree(object):
 
     Each element of the proof supplies the index that the previous output will be inserted
     into the list of other elements in the hash to re-construct the root
+
+    Nodes which don't exist yet are filled in by `hasher.unique()`. In sparse mode
+    they are instead default values: `0` for leaves, and the hash of `width` default
+    nodes for each level above, which are computed once when the tree is created.
+
+    The levels are kept in memory, unless a `storage` such as a `MmapNodeStore`
+    is provided.
+
+    When `indexed` the tree keeps a map of each leaf to its offsets, so `in` and
+    `index()` don't have to scan every leaf. The map is built on first use. With
+    storage shared between processes each lookup is checked against the stored
+    leaves, and the map is rebuilt after another process updates leaves in place.
     """
 
-    def __init__(self, n_items, width=2, hasher=None):
+    def __init__(
+        self, n_items, width=2, hasher=None, sparse=False, storage=None, indexed=False
+    ):
         assert n_items >= width
         assert (n_items % width) == 0
         if hasher is None:
             hasher = DEFAULT_HASHER
         self._width = width
-        self._tree_depth = int(math.log(n_items, width))
+        self._tree_depth = tree_depth(n_items, width)
         self._hasher = hasher(self._tree_depth, width)
         self._n_items = n_items
         self._cur = 0
         self._leaves = [list() for _ in range(0, self._tree_depth + 1)]
+        self._storage = storage
+        if storage is not None:
+            if (storage.n_items, storage.width) != (n_items, width):
+                raise ValueError("Storage dimensions don't match the tree")
+            if storage.sparse != sparse:
+                raise ValueError("Storage sparse mode doesn't match the tree")
+            self._leaves = storage.levels
+            self._cur = len(self._leaves[0])
+        self._indexed = indexed
+        self._leaf_index = None
+        self._leaf_index_len = 0
+        self._defaults = None
+        if sparse:
+            self._defaults = [0]
+            for depth in range(self._tree_depth):
+                node = [self._defaults[depth]] * width
+                self._defaults.append(self._hasher.hash_node(depth, *node))
+
+    @classmethod
+    def from_leaves(
+        cls,
+        leaves,
+        n_items=None,
+        width=2,
+        hasher=None,
+        sparse=False,
+        workers=None,
+        indexed=False,
+    ):
+        """
+        Build a tree from a sequence of leaves, hashing every node once
+
+        By default the tree is the smallest that will fit all of the leaves, see
+        `extend` for `workers`.
+        """
+        leaves = list(leaves)
+        if n_items is None:
+            n_items = width
+            while n_items < len(leaves):
+                n_items *= width
+        tree = cls(n_items, width, hasher, sparse, indexed=indexed)
+        tree.extend(leaves, workers)
+        return tree
+
+    @classmethod
+    def create(
+        cls, filename, n_items, width=2, hasher=None, sparse=False, indexed=False
+    ):
+        """
+        Create a new tree stored in a memory-mapped file
+        """
+        storage = MmapNodeStore.create(filename, n_items, width, sparse)
+        return cls(n_items, width, hasher, sparse, storage, indexed)
+
+    @classmethod
+    def open(cls, filename, hasher=None, readonly=False, indexed=False):
+        """
+        Re-open a tree stored in a memory-mapped file, without re-hashing it
+
+        The hasher must be the same as the tree was created with. Any number of
+        processes can open the same file with `readonly=True` to serve proofs.
+        """
+        storage = MmapNodeStore.open(filename, readonly)
+        return cls(
+            storage.n_items, storage.width, hasher, storage.sparse, storage, indexed
+        )
+
+    def flush(self):
+        if self._storage is not None:
+            self._storage.flush()
+
+    def close(self):
+        if self._storage is not None:
+            self._storage.close()
+
+    @property
+    def sparse(self):
+        return self._defaults is not None
 
     def __len__(self):
+        if self._storage is not None:
+            # Another process may be appending to the same storage
+            self._cur = len(self._leaves[0])
         return self._cur
 
-    def update(self, index, leaf):
+    @staticmethod
+    def _check_leaf(leaf):
         if isinstance(leaf, FQ):
             leaf = leaf.n
         if not isinstance(leaf, int):
             raise TypeError("Invalid leaf")
         assert leaf >= 0 and leaf < SNARK_SCALAR_FIELD
+        return leaf
+
+    def update(self, index, leaf):
+        leaf = self._check_leaf(leaf)
         if (len(self._leaves[0]) - 1) < index:
             raise KeyError("Out of bounds")
+        if self._leaf_index is not None and index < self._leaf_index_len:
+            old_offsets = self._leaf_index.get(self._leaves[0][index])
+            if old_offsets is None or index not in old_offsets:
+                # Changed by another process sharing the storage, rebuild on next use
+                self._leaf_index = None
+            else:
+                old_offsets.remove(index)
+                if not old_offsets:
+                    del self._leaf_index[self._leaves[0][index]]
+                bisect.insort(self._leaf_index.setdefault(leaf, []), index)
         self._leaves[0][index] = leaf
         self._updateTree(index)
 
     def append(self, leaf):
         if self._cur >= (self._n_items):
             raise RuntimeError("Tree Full")
-        if isinstance(leaf, FQ):
-            leaf = leaf.n
-        assert leaf >= 0 and leaf < SNARK_SCALAR_FIELD
+        leaf = self._check_leaf(leaf)
         self._leaves[0].append(leaf)
         self._updateTree()
         self._cur += 1
         return self._cur - 1
 
+    def extend(self, leaves, workers=None):
+        """
+        Append many leaves, only hashing each affected node once per level
+
+        Appending N leaves one at a time re-hashes the path to the root every time,
+        costing N*depth hashes, this costs about N/(width-1) hashes.
+
+        With `workers` the leaves are split into independent subtrees which are
+        hashed in a pool of that many processes, the hasher must be picklable.
+        """
+        leaves = [self._check_leaf(_) for _ in leaves]
+        if self._cur + len(leaves) > self._n_items:
+            raise RuntimeError("Tree Full")
+        if not leaves:
+            return
+        start = self._cur
+        self._leaves[0].extend(leaves)
+        self._cur += len(leaves)
+        if workers is not None and workers > 1:
+            self._rehash_parallel(start, workers)
+        else:
+            self._rehash(start)
+
     def __getitem__(self, key):
         if not isinstance(key, int):
             raise TypeError("Invalid key")
-        if key < 0 or key >= self._cur:
+        if key < 0 or key >= len(self):
             raise KeyError("Out of bounds")
         return self._leaves[0][key]
 
     def __setitem__(self, key, value):
         self.update(key, value)
 
+    def _leaf_offsets(self):
+        """
+        Map of leaf to its offsets, updated with any leaves appended since it was
+        last used (possibly by another process sharing the storage)
+        """
+        if self._leaf_index is None:
+            self._leaf_index = dict()
+            self._leaf_index_len = 0
+        count = len(self._leaves[0])
+        if self._leaf_index_len < count:
+            new_leaves = self._leaves[0][self._leaf_index_len : count]
+            for offset, leaf in enumerate(new_leaves, self._leaf_index_len):
+                self._leaf_index.setdefault(leaf, []).append(offset)
+            self._leaf_index_len = count
+        return self._leaf_index
+
+    def _indexed_offsets(self, leaf):
+        """
+        Offsets of `leaf` from the leaf index
+
+        With storage the leaves may have been updated in place by another process,
+        so every hit is checked against the stored leaf, and a miss against the
+        store itself. The index is rebuilt when either shows it is out of date.
+        """
+        if isinstance(leaf, FQ):
+            leaf = leaf.n
+        offsets = self._leaf_offsets().get(leaf)
+        if self._storage is None:
+            return offsets
+        level = self._leaves[0]
+        if offsets:
+            if all(level[_] == leaf for _ in offsets):
+                return offsets
+        elif leaf not in level:
+            return None
+        self._leaf_index = None
+        return self._leaf_offsets().get(leaf)
+
     def __contains__(self, key):
+        if self._indexed:
+            return bool(self._indexed_offsets(key))
         return key in self._leaves[0]
 
     def index(self, leaf):
+        if self._indexed:
+            offsets = self._indexed_offsets(leaf)
+            if not offsets:
+                raise ValueError("%r is not in tree" % (leaf,))
+            return offsets[0]
         return self._leaves[0].index(leaf)
 
     def _make_node(self, depth, index):
@@ -167,7 +496,7 @@ class MerkleTree(object):
 
     def proof(self, index):
         leaf = self[index]
-        if index >= self._cur:
+        if index >= len(self):
             raise RuntimeError("Proof for invalid item!")
         address_bits = list()
         merkle_proof = list()
@@ -181,6 +510,25 @@ class MerkleTree(object):
             index = index // self._width
         return MerkleProof(leaf, address_bits, merkle_proof, self._hasher, self._width)
 
+    def multiproof(self, indices):
+        """
+        Proof for many leaves at once, sharing the nodes common to their paths
+        """
+        indices = sorted(set(indices))
+        if not indices:
+            raise ValueError("No indices")
+        leaves = [self[_] for _ in indices]
+        nodes = list()
+        for depth, known in enumerate(
+            _multiproof_levels(indices, self._width, self._tree_depth)
+        ):
+            nodes += [
+                self.leaf(depth, _) for _ in _multiproof_siblings(known, self._width)
+            ]
+        return MerkleMultiProof(
+            leaves, indices, nodes, self._hasher, self._width, self._tree_depth
+        )
+
     def _updateTree(self, cur_index=None):
         cur_index = self._cur if cur_index is None else cur_index
         for depth in range(self._tree_depth):
@@ -193,13 +541,70 @@ class MerkleTree(object):
                 self._leaves[depth + 1][next_index] = node
             cur_index = next_index
 
+    def _rehash(self, start, first_depth=0):
+        """
+        Re-compute every node on the levels above which depends on items from
+        offset `start` to the end of level `first_depth`
+        """
+        width = self._width
+        for depth in range(first_depth, self._tree_depth):
+            start -= start % width
+            items = self._leaves[depth][start:]
+            nodes = _hash_level(
+                self._hasher, width, depth, items, start, self._defaults
+            )
+            _write_level(self._leaves[depth + 1], start // width, nodes)
+            start //= width
+
+    def _rehash_parallel(self, start, workers):
+        """
+        Re-compute the levels above `start` by hashing subtrees in a process pool,
+        then hashing the levels above the subtree roots sequentially
+        """
+        width = self._width
+        end = len(self._leaves[0])
+        # Pick the tallest subtrees which still give every worker a few of them
+        height = 0
+        while (
+            height < self._tree_depth
+            and (end - start) // (width ** (height + 1)) >= workers * 2
+        ):
+            height += 1
+        if height == 0:
+            return self._rehash(start)
+
+        size = width ** height
+        start -= start % size
+        offsets = list(range(start, end, size))
+        chunks = [self._leaves[0][_ : _ + size] for _ in offsets]
+        n = len(offsets)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            subtrees = list(
+                pool.map(
+                    _hash_subtree,
+                    [self._hasher] * n,
+                    [width] * n,
+                    [height] * n,
+                    chunks,
+                    offsets,
+                    [self._defaults] * n,
+                )
+            )
+
+        for depth in range(1, height + 1):
+            nodes = [_ for levels in subtrees for _ in levels[depth - 1]]
+            _write_level(self._leaves[depth], start // (width ** depth), nodes)
+        self._rehash(start // size, height)
+
     def leaf(self, depth, offset):
         if offset >= len(self._leaves[depth]):
+            if self._defaults is not None:
+                return self._defaults[depth]
             return self._hasher.unique(depth, offset)
         return self._leaves[depth][offset]
 
     @property
     def root(self):
-        if self._cur == 0:
+        if len(self) == 0:
             return None
         return self._leaves[self._tree_depth][0]
@@ -55,6 +55,23 @@ def mimc_constants(seed=DEFAULT_SEED, p=SNARK_SCALAR_FIELD, R=DEFAULT_ROUNDS):
         yield seed
 
 
+# Round constants reduced modulo p, keyed by (seed, p, R)
+_CONSTANTS_CACHE = dict()
+
+
+def _round_constants(seed, p, R):
+    if isinstance(seed, str):
+        seed = seed.encode("ascii")
+    elif not isinstance(seed, bytes):
+        seed = int(seed)
+    key = (seed, p, R)
+    constants = _CONSTANTS_CACHE.get(key)
+    if constants is None:
+        constants = tuple(_ % p for _ in mimc_constants(seed, p, R))
+        _CONSTANTS_CACHE[key] = constants
+    return constants
+
+
 def mimc(
     x, k, seed=DEFAULT_SEED, p=SNARK_SCALAR_FIELD, e=DEFAULT_EXPONENT, R=DEFAULT_ROUNDS
 ):
@@ -90,9 +107,16 @@ def mimc(
     """
     assert R > 2
     # TODO: assert gcd(p-1, e) == 1
-    for c_i in list(mimc_constants(seed, p, R)):
-        a = (x + k + c_i) % p
-        x = (a ** e) % p
+    constants = _round_constants(seed, p, R)
+    if e == 7:
+        for c_i in constants:
+            a = (x + k + c_i) % p
+            # a^7 = a * a^2 * a^4, with 4 multiplications
+            a2 = (a * a) % p
+            x = (((a2 * a2) % p) * a2 * a) % p
+    else:
+        for c_i in constants:
+            x = pow((x + k + c_i) % p, e, p)
     return (x + k) % p
 
 
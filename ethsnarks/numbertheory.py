@@ -135,35 +135,34 @@ def polynomial_exp_mod(base, exponent, polymod, p):
 def jacobi(a, n):
     """Jacobi symbol"""
 
-    # Based on the Handbook of Applied Cryptography (HAC), algorithm 2.149.
-
-    # This function has been tested by comparison with a small
-    # table printed in HAC, and by extensive use in calculating
-    # modular square roots.
+    # Binary algorithm, see Cohen, "A Course in Computational Algebraic
+    # Number Theory", algorithm 1.4.10. Factors of two are removed with
+    # shifts and the quadratic reciprocity step is a swap, so there is
+    # no recursion and no division other than the reduction `n % a`.
 
     assert n >= 3
     assert n % 2 == 1
     a = a % n
-    if a == 0:
-        return 0
-    if a == 1:
-        return 1
-    a1, e = a, 0
-    while a1 % 2 == 0:
-        a1, e = a1 // 2, e + 1
-    if e % 2 == 0 or n % 8 == 1 or n % 8 == 7:
-        s = 1
-    else:
-        s = -1
-    if a1 == 1:
-        return s
-    if n % 4 == 3 and a1 % 4 == 3:
-        s = -s
-    return s * jacobi(n % a1, a1)
+    s = 1
+    while a != 0:
+        e = (a & -a).bit_length() - 1
+        if e:
+            a >>= e
+            if e & 1 and (n & 7) in (3, 5):
+                s = -s
+        # Reciprocity, a and n are both odd here
+        if (a & n & 3) == 3:
+            s = -s
+        a, n = n % a, a
+    return s if n == 1 else 0
 
 
 def square_root_mod_prime(a, p):
-    """Modular square root of a, mod p, p prime."""
+    """Modular square root of a, mod p, p prime.
+
+  For p = 1 mod 8 the smaller of the two roots is returned, see
+  `square_root_tonelli_shanks`. Otherwise which root is returned
+  depends on the algorithm used for p."""
 
     # Based on the Handbook of Applied Cryptography, algorithms 3.34 to 3.39.
 
@@ -178,6 +177,10 @@ def square_root_mod_prime(a, p):
     if p == 2:
         return a
 
+    if p % 8 == 1:
+        # Neither shortcut applies, e.g. the SNARK scalar field
+        return square_root_tonelli_shanks(a, p)
+
     jac = jacobi(a, p)
     if jac == -1:
         raise SquareRootError("%d has no square root modulo %d" % (a, p))
@@ -193,13 +196,79 @@ def square_root_mod_prime(a, p):
             return (2 * a * modular_exp(4 * a, (p - 5) // 8, p)) % p
         raise RuntimeError("Shouldn't get here.")
 
-    for b in range(2, p):
-        if jacobi(b * b - 4 * a, p) == -1:
-            f = (a, -b, 1)
-            ff = polynomial_exp_mod((0, 1), (p + 1) // 2, f, p)
-            assert ff[1] == 0
-            return ff[0]
-    raise RuntimeError("No b found.")
+
+class TonelliShanksParams(object):
+    """
+    Per-prime constants for `square_root_tonelli_shanks`
+
+    With `p - 1 = q * 2^s`, q odd, and `z` the smallest quadratic non-residue,
+    `roots[i] = (z^q)^(2^i)` is a primitive `2^(s-i)`-th root of unity.
+    """
+
+    __slots__ = ("p", "q", "s", "z", "roots")
+
+    def __init__(self, p):
+        s = ((p - 1) & (1 - p)).bit_length() - 1
+        z = 2
+        while jacobi(z, p) != -1:
+            z += 1
+        c = modular_exp(z, (p - 1) >> s, p)
+        roots = [c]
+        for _ in range(s - 1):
+            c = (c * c) % p
+            roots.append(c)
+        self.p = p
+        self.q = (p - 1) >> s
+        self.s = s
+        self.z = z
+        self.roots = roots
+
+
+_TONELLI_SHANKS = dict()
+
+
+def tonelli_shanks_params(p):
+    """Return the cached `TonelliShanksParams` for the prime p"""
+    params = _TONELLI_SHANKS.get(p)
+    if params is None:
+        params = _TONELLI_SHANKS[p] = TonelliShanksParams(p)
+    return params
+
+
+def square_root_tonelli_shanks(a, p):
+    """Modular square root of a, mod p, p an odd prime.
+
+  Uses a single exponentiation, `a^((q-1)/2)`, from which both the
+  candidate root `a^((q+1)/2)` and the correction term `a^q` follow.
+  The correction is then cancelled with the precomputed 2-adic roots
+  of unity, which also detects non-residues without a Jacobi symbol.
+
+  The root returned is the canonical one, the smaller of x and p - x."""
+
+    params = tonelli_shanks_params(p)
+    a = a % p
+    if a == 0:
+        return 0
+    roots = params.roots
+    w = modular_exp(a, (params.q - 1) // 2, p)
+    x = (a * w) % p
+    t = (x * w) % p
+    m = params.s
+    while t != 1:
+        # Find the least i with t^(2^i) == 1, t has order 2^i
+        i = 0
+        tt = t
+        while tt != 1:
+            tt = (tt * tt) % p
+            i += 1
+            if i == m:
+                raise SquareRootError("%d has no square root modulo %d" % (a, p))
+        # b = c^(2^(m-i-1)), where c is a primitive 2^m-th root of unity
+        b = roots[params.s - i - 1]
+        x = (x * b) % p
+        t = (t * b * b) % p
+        m = i
+    return min(x, p - x)
 
 
 def inverse_mod(a, m):
@@ -1,21 +1,37 @@
+import os
+import json
 import math
 import bitstring
 from math import floor, log2
 from struct import pack
 
-from .jubjub import Point, EtecPoint, JUBJUB_L, JUBJUB_C
+from .jubjub import Point, JUBJUB_L, JUBJUB_C
+from .jubjub import _ETEC_INFINITY, _etec_raw, _etec_point, _etec_add
+from .jubjub import _etec_double, _etec_neg
 
 
 MAX_SEGMENT_BITS = floor(log2(JUBJUB_L))
 MAX_SEGMENT_BYTES = MAX_SEGMENT_BITS // 8
 
+# 62 is defined in the ZCash Sapling Specification, Theorem 5.4.1
+# See: https://github.com/HarryR/ethsnarks/issues/121#issuecomment-499441289
+N_WINDOWS = 62
 
-def pedersen_hash_basepoint(name, i):
-    """
-	Create a base point for use with the windowed pedersen hash function.
-	The name and sequence numbers are used a unique identifier.
-	Then HashToPoint is run on the name+seq to get the base point.
-	"""
+PEDERSEN_TABLES_FILE_ENV = "ETHSNARKS_PEDERSEN_TABLES"
+
+# Base points and their window tables, keyed by (name, segment)
+_BASEPOINTS = dict()
+_WINDOW_TABLES = dict()
+
+
+# Reverses the order of the bits in a byte, so message bytes which are read most
+# significant bit first can be handled as little-endian integers
+_BIT_REVERSE = bytes(
+    sum(((i >> j) & 1) << (7 - j) for j in range(8)) for i in range(256)
+)
+
+
+def _basepoint_key(name, i):
     if not isinstance(name, bytes):
         if isinstance(name, str):
             name = name.encode("ascii")
@@ -25,37 +41,161 @@ def pedersen_hash_basepoint(name, i):
         raise ValueError("Sequence number invalid")
     if len(name) > 28:
         raise ValueError("Name too long")
-    data = b"%-28s%04X" % (name, i)
-    return Point.from_hash(data).as_etec()
+    return (name, i)
+
+
+def pedersen_hash_basepoint(name, i):
+    """
+	Create a base point for use with the windowed pedersen hash function.
+	The name and sequence numbers are used a unique identifier.
+	Then HashToPoint is run on the name+seq to get the base point.
+
+	Base points are cached, HashToPoint only runs once per (name, i).
+	"""
+    key = _basepoint_key(name, i)
+    point = _BASEPOINTS.get(key)
+    if point is None:
+        data = b"%-28s%04X" % key
+        point = _BASEPOINTS[key] = Point.from_hash(data).as_etec()
+    return point
+
+
+def pedersen_window_table(name, i):
+    """
+	Lookup table for segment `i`, one row per window:
+
+		[P, 2*P, 3*P, 4*P] where P = 2**4j * base
+
+	Rows are in raw extended coordinates and cached, so each window of
+	a hash costs one lookup and one addition.
+	"""
+    key = _basepoint_key(name, i)
+    table = _WINDOW_TABLES.get(key)
+    if table is None:
+        current = _etec_raw(pedersen_hash_basepoint(*key))
+        rows = []
+        for j in range(N_WINDOWS):
+            if j != 0:
+                for _ in range(4):
+                    current = _etec_double(current)
+            double = _etec_double(current)
+            triple = _etec_add(double, current)
+            rows.append((current, double, triple, _etec_double(double)))
+        table = _WINDOW_TABLES[key] = tuple(rows)
+    return table
+
+
+def pedersen_tables_save(filename, keys=None):
+    """
+	Persist window tables, by default every one built by this process,
+	to a JSON file which can be loaded with `pedersen_tables_load`
+	"""
+    if keys is None:
+        keys = list(_WINDOW_TABLES.keys())
+    data = [
+        dict(
+            name=name.hex(),
+            segment=i,
+            table=[[[hex(c) for c in entry] for entry in row] for row in table],
+        )
+        for name, i in keys
+        for table in [pedersen_window_table(name, i)]
+    ]
+    with open(filename, "w") as handle:
+        json.dump(data, handle)
+
+
+def pedersen_tables_load(filename):
+    """
+	Load window tables saved by `pedersen_tables_save` into the cache,
+	returns the (name, segment) keys which were loaded.
+	"""
+    with open(filename, "r") as handle:
+        data = json.load(handle)
+    result = []
+    for item in data:
+        key = _basepoint_key(bytes.fromhex(item["name"]), item["segment"])
+        table = tuple(
+            tuple(tuple(int(c, 16) for c in entry) for entry in row)
+            for row in item["table"]
+        )
+        if len(table) != N_WINDOWS or any(len(row) != 4 for row in table):
+            raise ValueError("Invalid window table dimensions")
+        if any(len(entry) != 4 for row in table for entry in row):
+            raise ValueError("Invalid window table point")
+        base = _etec_point(table[0][0])
+        if not base.valid():
+            raise ValueError("Window table base point not on curve")
+        _BASEPOINTS[key] = base.as_etec()
+        _WINDOW_TABLES[key] = table
+        result.append(key)
+    return result
 
 
 def pedersen_hash_windows(name, windows):
-    # 62 is defined in the ZCash Sapling Specification, Theorem 5.4.1
-    # See: https://github.com/HarryR/ethsnarks/issues/121#issuecomment-499441289
-    n_windows = 62
-    result = EtecPoint.infinity()
+    result = _ETEC_INFINITY
     for j, window in enumerate(windows):
-        if j % n_windows == 0:
-            current = pedersen_hash_basepoint(name, j // n_windows)
-        j = j % n_windows
-        if j != 0:
-            current = current.double().double().double().double()
-        segment = current * ((window & 0b11) + 1)
+        if j % N_WINDOWS == 0:
+            table = pedersen_window_table(name, j // N_WINDOWS)
+        segment = table[j % N_WINDOWS][window & 0b11]
         if window > 0b11:
-            segment = segment.neg()
-        result += segment
-    return result.as_point()
+            segment = _etec_neg(segment)
+        result = _etec_add(result, segment)
+    return _etec_point(result)
+
+
+# The four 3-bit windows of every 12-bit value, least significant first
+_WINDOWS_12 = tuple(
+    tuple((i >> shift) & 0b111 for shift in range(0, 12, 3)) for i in range(1 << 12)
+)
+
+
+def _le_windows(data, n_windows):
+    # Every 3 bytes of the little-endian bit stream are exactly 8 windows
+    windows = []
+    for i in range(0, len(data), 3):
+        chunk = int.from_bytes(data[i : i + 3], "little")
+        windows += _WINDOWS_12[chunk & 0xFFF]
+        windows += _WINDOWS_12[chunk >> 12]
+    del windows[n_windows:]
+    return windows
+
+
+def int_windows(value, nbits):
+    """
+	Return the 3-bit windows of the lowest `nbits` bits of `value`, starting
+	with the least significant bits. The last window is padded with zeros
+	when `nbits` is not a multiple of 3.
+	"""
+    value &= (1 << nbits) - 1
+    nbytes = -(-nbits // 24) * 3
+    return _le_windows(value.to_bytes(nbytes, "little"), -(-nbits // 3))
+
+
+def bytes_windows(data):
+    """
+	Return the 3-bit windows of `data`, where each byte is read most
+	significant bit first, the bit order used by `pedersen_hash_bytes`
+	"""
+    return _le_windows(bytes(data).translate(_BIT_REVERSE), -(-len(data) * 8 // 3))
+
+
+def pedersen_hash_int(name, value, nbits):
+    """
+	Hashes the lowest `nbits` bits of `value` into a point, the same as
+	`pedersen_hash_bits` of those bits with the least significant first.
+	"""
+    assert nbits > 0
+    return pedersen_hash_windows(name, int_windows(value, nbits))
 
 
 def pedersen_hash_bits(name, bits):
-    # Split into 3 bit windows
+    # The first bit is the least significant of each 3 bit window
     if isinstance(bits, bitstring.BitArray):
-        bits = bits.bin
-    windows = [int(bits[i : i + 3][::-1], 2) for i in range(0, len(bits), 3)]
-    assert len(windows) > 0
-
-    # Hash resulting windows
-    return pedersen_hash_windows(name, windows)
+        value = bits[::-1].uint if len(bits) else 0
+    else:
+        value = int(bits[::-1], 2) if len(bits) else 0
+    return pedersen_hash_int(name, value, len(bits))
 
 
 def pedersen_hash_bytes(name, data):
@@ -68,10 +208,7 @@ def pedersen_hash_bytes(name, data):
     assert isinstance(data, bytes)
     assert len(data) > 0
 
-    # Decode bytes to octets of binary bits
-    bits = "".join([bin(_)[2:].rjust(8, "0") for _ in data])
-
-    return pedersen_hash_bits(name, bits)
+    return pedersen_hash_windows(name, bytes_windows(data))
 
 
 def pedersen_hash_scalars(name, *scalars):
@@ -102,3 +239,7 @@ def pedersen_hash_scalars(name, *scalars):
     for i, s in enumerate(scalars):
         windows += list((s >> i) & 0b111 for i in range(0, s.bit_length(), 3))
     return pedersen_hash_windows(name, windows)
+
+
+if os.getenv(PEDERSEN_TABLES_FILE_ENV):
+    pedersen_tables_load(os.getenv(PEDERSEN_TABLES_FILE_ENV))
@@ -0,0 +1,250 @@
+"""
+Batched Poseidon permutation, hashing many independent inputs together
+
+Every field element is kept in Montgomery form as `N_LIMBS` little-endian 16-bit
+limbs in a NumPy uint64 array, so the whole batch of states is processed by the
+same array operations:
+
+ - Variable products (the S-box) are schoolbook limb products in uint64
+ - Products with constants (the MDS matrix, the sparse partial round matrices)
+   are a single matrix product against a table of shifted constant limbs. With
+   16-bit limbs every column sum stays below 2^53, so these are exact in float64
+   and go through BLAS.
+ - Montgomery reduction uses `R = 2^(16 * N_LIMBS)`, which is large enough that
+   reduced values stay below ~1.02p without conditional subtractions.
+
+Limbs are only kept 'semi-normalized' (slightly above 16 bits) between operations,
+full carry propagation and the final reduction modulo p happen on output.
+
+The rounds are the sparse form from `poseidon_optimize`, the results are identical
+to `poseidon()` for the same inputs.
+"""
+
+import numpy as np
+
+from ..numbertheory import inverse_mod
+from .permutation import DefaultParams, PoseidonParamsType, poseidon_optimized_params
+
+
+LIMB_BITS = 16
+LIMB_MASK = (1 << LIMB_BITS) - 1
+N_LIMBS = 17
+
+
+def _int_limbs(n, count):
+    return [(n >> (LIMB_BITS * i)) & LIMB_MASK for i in range(count)]
+
+
+def _normalize(x, passes=1, truncate=False):
+    """
+    Propagate carries between limbs (axis 0) in parallel, `passes` times
+
+    Each pass reduces the excess of every limb above 16 bits by 16 bits. The last
+    limb is left unbounded, unless `truncate` is set in which case its carry is
+    dropped (reducing modulo 2^(16 * len(x))).
+    """
+    for _ in range(passes):
+        carry = x >> LIMB_BITS if truncate else x[:-1] >> LIMB_BITS
+        if truncate:
+            x &= LIMB_MASK
+        else:
+            x[:-1] &= LIMB_MASK
+        x[1:] += carry[: len(x) - 1]
+    return x
+
+
+class _LimbField(object):
+    """
+    Montgomery arithmetic modulo p
+
+    Values are arrays of shape (N_LIMBS, ...), limb-major, so that each limb of a
+    whole batch is contiguous in memory.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.R = 1 << (LIMB_BITS * N_LIMBS)
+        self.R_inv = pow(self.R, p - 2, p)
+        nprime = (-inverse_mod(p, self.R)) % self.R
+        self.nprime_matrix = self.constant_matrix(nprime, N_LIMBS).T.copy()
+        self.p_matrix = self.constant_matrix(p, 2 * N_LIMBS).T.copy()
+        self.carry_weights = np.array(
+            [2.0 ** (LIMB_BITS * (k - N_LIMBS)) for k in range(N_LIMBS)]
+        )
+
+    @staticmethod
+    def constant_matrix(c, out_limbs):
+        """
+        Limbs of `c` shifted per row, so `x @ K` gives the columns of `x * c`
+        """
+        c_limbs = _int_limbs(c, out_limbs)
+        K = np.zeros((N_LIMBS, out_limbs))
+        for i in range(N_LIMBS):
+            K[i, i:] = c_limbs[: out_limbs - i]
+        return K
+
+    def linear_matrix(self, M):
+        """
+        Matrix computing `out[i] = sum(M[i][j] * in[j])` with Montgomery form
+        constants, from input of shape (N_LIMBS, n_in, rows) flattened to two
+        dimensions, to product columns of shape (2 * N_LIMBS, n_out, rows).
+        """
+        n_out, n_in = len(M), len(M[0])
+        K = np.zeros((2 * N_LIMBS, n_out, N_LIMBS, n_in))
+        for i, row in enumerate(M):
+            for j, c in enumerate(row):
+                K[:, i, :, j] = self.constant_matrix(self.to_mont(c), 2 * N_LIMBS).T
+        return K.reshape(2 * N_LIMBS * n_out, N_LIMBS * n_in)
+
+    def to_mont(self, n):
+        return (n * self.R) % self.p
+
+    def to_limbs(self, values):
+        nbytes = N_LIMBS * LIMB_BITS // 8
+        data = b"".join(self.to_mont(_).to_bytes(nbytes, "little") for _ in values)
+        x = np.frombuffer(data, dtype="<u2").reshape(-1, N_LIMBS)
+        return x.T.astype(np.uint64)
+
+    def from_limbs(self, x):
+        x = x.copy()
+        for k in range(N_LIMBS - 1):
+            x[k + 1] += x[k] >> LIMB_BITS
+            x[k] &= LIMB_MASK
+        p, R_inv = self.p, self.R_inv
+        data = x.T.astype("<u2").tobytes()
+        nbytes = N_LIMBS * LIMB_BITS // 8
+        return [
+            (int.from_bytes(data[i : i + nbytes], "little") * R_inv) % p
+            for i in range(0, len(data), nbytes)
+        ]
+
+    def redc(self, T):
+        """
+        Montgomery reduction of product columns (2 * N_LIMBS, rows): T / R mod p
+
+        The number of carry passes keeps every float64 product sum exact for
+        inputs with limbs below 2^47, the result has limbs below 2^17.
+        """
+        T = _normalize(T)
+        # m = (T mod R) * -p^-1 mod R
+        m = (self.nprime_matrix @ T[:N_LIMBS].astype(np.float64)).astype(np.uint64)
+        m = _normalize(m, 2, truncate=True)
+        U = T + (self.p_matrix @ m.astype(np.float64)).astype(np.uint64)
+        # The low half of U is an exact multiple of R, its carry into the high half
+        # is an integer small enough to be recovered exactly from a float sum
+        carry = np.rint(self.carry_weights @ U[:N_LIMBS].astype(np.float64))
+        result = U[N_LIMBS:]
+        result[0] += carry.astype(np.uint64)
+        return _normalize(result)
+
+    def mul(self, a, b):
+        T = np.zeros((2 * N_LIMBS,) + a.shape[1:], dtype=np.uint64)
+        for i in range(N_LIMBS):
+            T[i : i + N_LIMBS] += a[i] * b
+        return self.redc(T)
+
+    def pow(self, x, e):
+        result = None
+        for bit in bin(e)[2:]:
+            if result is not None:
+                result = self.mul(result, result)
+            if bit == "1":
+                result = x if result is None else self.mul(result, x)
+        return result
+
+    def linear(self, x, K):
+        """
+        Apply a `linear_matrix` to values of shape (N_LIMBS, n_in, rows)
+        """
+        rows = x.shape[-1]
+        T = (K @ x.reshape(-1, rows).astype(np.float64)).astype(np.uint64)
+        return self.redc(T.reshape(2 * N_LIMBS, -1)).reshape(N_LIMBS, -1, rows)
+
+
+class _BatchParams(object):
+    """
+    Limb form of the constants and matrices of an optimized parameter set
+    """
+
+    def __init__(self, params):
+        opt = poseidon_optimized_params(params)
+        if opt is None:
+            raise ValueError("Parameters have no sparse partial round form")
+        M = params.constants_M
+        F = _LimbField(params.p)
+        self.field = F
+        self.constants_C = [F.to_limbs(_)[:, :, None] for _ in opt.constants_C]
+        self.constants_P = [F.to_limbs([_]) for _ in opt.constants_P]
+        self.full_matrix = F.linear_matrix(M)
+        self.partial_first = [
+            F.linear_matrix([[M[0][0]] + list(v)]) for v in opt.sparse_v
+        ]
+        self.partial_rest = [F.linear_matrix([[_] for _ in w]) for w in opt.sparse_w]
+        self.matrix_H = F.linear_matrix(opt.matrix_H)
+
+
+_BATCH_CACHE = dict()
+
+
+def _batch_params(params):
+    entry = _BATCH_CACHE.get(id(params))
+    if entry is None or entry[0] is not params:
+        entry = _BATCH_CACHE[id(params)] = (params, _BatchParams(params))
+    return entry[1]
+
+
+def poseidon_batch(inputs, params=None, chained=False):
+    """
+    Apply the Poseidon permutation to many inputs at once
+
+    `inputs` is a list of input lists, each as would be passed to `poseidon()`.
+    Returns a list with the result for each input, or the full state of each
+    in 'chained' mode.
+    """
+    if params is None:
+        params = DefaultParams
+    assert isinstance(params, PoseidonParamsType)
+    if len(inputs) == 0:
+        return []
+    t, e = params.t, params.e
+    columns = [[0] * len(inputs) for _ in range(t)]
+    for i, item in enumerate(inputs):
+        assert len(item) > 0
+        if not chained:
+            # Don't allow inputs to exceed the rate, unless in chained mode
+            assert len(item) < t
+        assert len(item) <= t
+        for j, x in enumerate(item):
+            columns[j][i] = x
+
+    P = _batch_params(params)
+    F = P.field
+    n = len(inputs)
+    # State is (limbs, t, n), so each limb of each state element is contiguous
+    state = F.to_limbs(sum(columns, [])).reshape(N_LIMBS, t, n)
+    half_F = params.nRoundsF // 2
+
+    def full_round(state, C_i):
+        state = F.pow((state + C_i).reshape(N_LIMBS, t * n), e)
+        return F.linear(state.reshape(N_LIMBS, t, n), P.full_matrix)
+
+    for i in range(half_F):
+        state = full_round(state, P.constants_C[i])
+
+    for k, first, rest in zip(P.constants_P, P.partial_first, P.partial_rest):
+        s0 = F.pow(state[:, 0] + k, e)
+        state[:, 0] = s0
+        rest = F.linear(s0[:, None], rest) + state[:, 1:]
+        first = F.linear(state, first)
+        state = _normalize(np.concatenate((first, rest), axis=1))
+
+    rest = F.linear(np.ascontiguousarray(state[:, 1:]), P.matrix_H)
+    state = np.concatenate((state[:, :1], rest), axis=1)
+
+    for i in range(half_F + params.nRoundsP, params.nRoundsF + params.nRoundsP):
+        state = full_round(state, P.constants_C[i])
+
+    if chained:
+        values = F.from_limbs(state.reshape(N_LIMBS, t * n))
+        return [[values[j * n + i] for j in range(t)] for i in range(n)]
+    return F.from_limbs(state[:, 0])
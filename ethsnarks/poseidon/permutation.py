@@ -14,6 +14,8 @@ Other implementations:
  - https://github.com/dusk-network/poseidon252
 """
 
+import os
+import json
 from math import log2, floor
 from collections import namedtuple
 from pyblake2 import blake2b
@@ -24,6 +26,14 @@ PoseidonParamsType = namedtuple(
     "_PoseidonParams",
     ("p", "t", "nRoundsF", "nRoundsP", "seed", "e", "constants_C", "constants_M"),
 )
+# Pickle finds the class by its type name, e.g. to pass parameters to a process pool
+_PoseidonParams = PoseidonParamsType
+
+# Environment variable naming a file of precomputed parameters, loaded on import
+POSEIDON_PARAMS_FILE_ENV = "ETHSNARKS_POSEIDON_PARAMS"
+
+# Registry of derived parameter sets, keyed by (p, t, nRoundsF, nRoundsP, seed, e)
+_PARAMS_REGISTRY = dict()
 
 
 def poseidon_params(
@@ -87,6 +97,12 @@ def poseidon_params(
     # - Select R_F to 6 or rhigher
     # - Select R_P that minimizes tRF +RP such that no inequation (1),(3),(4),(5) is satisfied.
 
+    # Derived constants are deterministic for a given key, only build them once per process
+    registry_key = (p, t, nRoundsF, nRoundsP, seed, e)
+    use_registry = constants_C is None and constants_M is None
+    if use_registry and registry_key in _PARAMS_REGISTRY:
+        return _PARAMS_REGISTRY[registry_key]
+
     if constants_C is None:
         constants_C = list(
             poseidon_constants(p, seed + b"_constants", nRoundsF + nRoundsP)
@@ -103,9 +119,74 @@ def poseidon_params(
         n_constraints *= 2
     # print('n_constraints', n_constraints)
 
-    return PoseidonParamsType(
+    params = PoseidonParamsType(
         p, t, nRoundsF, nRoundsP, seed, e, constants_C, constants_M
     )
+    if use_registry:
+        _PARAMS_REGISTRY[registry_key] = params
+    return params
+
+
+def poseidon_params_save(filename, params=None):
+    """
+    Persist parameter sets, with their round constants and MDS matrix, to a JSON file
+
+    By default every parameter set built by this process is saved, the file can be
+    loaded at startup with `poseidon_params_load` to skip deriving the constants.
+    """
+    if params is None:
+        params = list(_PARAMS_REGISTRY.values())
+    data = [
+        dict(
+            p=hex(_.p),
+            t=_.t,
+            nRoundsF=_.nRoundsF,
+            nRoundsP=_.nRoundsP,
+            seed=_.seed.hex(),
+            e=_.e,
+            constants_C=[hex(c) for c in _.constants_C],
+            constants_M=[[hex(m) for m in row] for row in _.constants_M],
+        )
+        for _ in params
+    ]
+    with open(filename, "w") as handle:
+        json.dump(data, handle)
+
+
+def poseidon_params_load(filename):
+    """
+    Load parameter sets saved by `poseidon_params_save` into the registry
+
+    Subsequent calls to `poseidon_params` with matching arguments return the loaded
+    parameters without re-deriving the constants. Returns the loaded parameters.
+    """
+    with open(filename, "r") as handle:
+        data = json.load(handle)
+    result = []
+    for item in data:
+        p = int(item["p"], 16)
+        t, nRoundsF, nRoundsP = item["t"], item["nRoundsF"], item["nRoundsP"]
+        constants_C = [int(_, 16) for _ in item["constants_C"]]
+        constants_M = [[int(_, 16) for _ in row] for row in item["constants_M"]]
+        if len(constants_C) != (nRoundsF + nRoundsP):
+            raise ValueError("Invalid number of round constants")
+        if len(constants_M) != t or any(len(row) != t for row in constants_M):
+            raise ValueError("Invalid MDS matrix dimensions")
+        if any(not (0 <= _ < p) for _ in constants_C + sum(constants_M, [])):
+            raise ValueError("Constant exceeds field modulus")
+        params = PoseidonParamsType(
+            p,
+            t,
+            nRoundsF,
+            nRoundsP,
+            bytes.fromhex(item["seed"]),
+            item["e"],
+            constants_C,
+            constants_M,
+        )
+        _PARAMS_REGISTRY[(p, t, nRoundsF, nRoundsP, params.seed, params.e)] = params
+        result.append(params)
+    return result
 
 
 def H(arg):
@@ -133,6 +214,10 @@ def poseidon_matrix(p, seed, t):
     return [[pow((c[i] - c[t + j]) % p, p - 2, p) for j in range(t)] for i in range(t)]
 
 
+if os.getenv(POSEIDON_PARAMS_FILE_ENV):
+    poseidon_params_load(os.getenv(POSEIDON_PARAMS_FILE_ENV))
+
+
 DefaultParams = poseidon_params(
     SNARK_SCALAR_FIELD, 6, 8, 57, b"poseidon", 5, security_target=126
 )
@@ -164,6 +249,139 @@ def poseidon_mix(state, M, p):
     return [sum([M[i][j] * _ for j, _ in enumerate(state)]) % p for i in range(len(M))]
 
 
+PoseidonOptimizedType = namedtuple(
+    "_PoseidonOptimized",
+    ("constants_C", "constants_P", "sparse_v", "sparse_w", "matrix_H"),
+)
+
+# Optimized form of each parameter set, keyed by id(params)
+_OPTIMIZED_CACHE = dict()
+
+
+def _matrix_mul(A, B, p):
+    return [
+        [sum([a * b for a, b in zip(row, col)]) % p for col in zip(*B)] for row in A
+    ]
+
+
+def _matrix_inverse(A, p):
+    """
+    Gauss-Jordan elimination modulo p, returns None if the matrix is singular
+    """
+    n = len(A)
+    R = [list(row) + [int(i == j) for j in range(n)] for i, row in enumerate(A)]
+    for col in range(n):
+        pivot = next((i for i in range(col, n) if R[i][col] % p != 0), None)
+        if pivot is None:
+            return None
+        R[col], R[pivot] = R[pivot], R[col]
+        inv = pow(R[col][col], p - 2, p)
+        R[col] = [(_ * inv) % p for _ in R[col]]
+        for i in range(n):
+            if i != col and R[i][col] != 0:
+                f = R[i][col]
+                R[i] = [(a - f * b) % p for a, b in zip(R[i], R[col])]
+    return [row[n:] for row in R]
+
+
+def poseidon_optimize(params):
+    """
+    iacr.org/2019/458 Appendix B, Efficient Implementation of Partial Rounds
+
+    In a partial round only `state[0]` passes through the S-box, so:
+
+     1. The round constants of elements `1..t-1` are moved forward through the
+        linear layer, leaving one constant per partial round. What remains is
+        added to the constants of the first of the final full rounds.
+
+     2. The MDS matrix is factored as `M = M' * M''`, where
+
+            M'  = [[1, 0], [0, M^]]        M^ = lower-right (t-1)x(t-1) block of M
+            M'' = [[M00, v], [w^, I]]      w^ = M^^-1 * w
+
+        `M'` commutes with the partial S-box layer, so it is pushed into the next
+        round's matrix. Each partial round then only multiplies by the sparse `M''`
+        (2t-1 multiplications instead of t^2) and the accumulated dense `M'` is
+        applied once after the last partial round.
+
+    Returns None if the parameters can't be put into this form.
+    """
+    p, t, M = params.p, params.t, params.constants_M
+    half_F = params.nRoundsF // 2
+    C = params.constants_C
+
+    # Move the partial round constants forward
+    constants_C = [[_] * t for _ in C]
+    constants_P = []
+    for i in range(half_F, half_F + params.nRoundsP):
+        c_i = constants_C[i]
+        constants_P.append(c_i[0] % p)
+        carry = [sum([m * c for m, c in zip(row[1:], c_i[1:])]) % p for row in M]
+        constants_C[i + 1] = [(a + b) % p for a, b in zip(constants_C[i + 1], carry)]
+
+    # Factor the partial round matrices into sparse form
+    M_hat = [row[1:] for row in M[1:]]
+    M_hat_inv = _matrix_inverse(M_hat, p)
+    if M_hat_inv is None:
+        return None
+    w = [[row[0]] for row in M[1:]]
+    H = [[int(i == j) for j in range(t - 1)] for i in range(t - 1)]
+    H_inv = H
+    sparse_v = []
+    sparse_w = []
+    for _ in range(params.nRoundsP):
+        sparse_v.append(_matrix_mul([M[0][1:]], H, p)[0])
+        H = _matrix_mul(M_hat, H, p)
+        H_inv = _matrix_mul(H_inv, M_hat_inv, p)
+        sparse_w.append([_[0] for _ in _matrix_mul(H_inv, w, p)])
+
+    return PoseidonOptimizedType(constants_C, constants_P, sparse_v, sparse_w, H)
+
+
+def poseidon_optimized_params(params):
+    """
+    Return the cached result of `poseidon_optimize` for a parameter set
+    """
+    entry = _OPTIMIZED_CACHE.get(id(params))
+    if entry is None or entry[0] is not params:
+        entry = _OPTIMIZED_CACHE[id(params)] = (params, poseidon_optimize(params))
+    return entry[1]
+
+
+def _poseidon_optimized(state, params):
+    opt = poseidon_optimized_params(params)
+    if opt is None:
+        return None
+
+    p, e, M = params.p, params.e, params.constants_M
+    M00 = M[0][0]
+    half_F = params.nRoundsF // 2
+    first_partial = half_F
+    last_partial = half_F + params.nRoundsP
+
+    def full_round(state, C_i):
+        state = [pow(x + c, e, p) for x, c in zip(state, C_i)]
+        return [sum([m * x for m, x in zip(row, state)]) % p for row in M]
+
+    for i in range(first_partial):
+        state = full_round(state, opt.constants_C[i])
+
+    for k, v, w in zip(opt.constants_P, opt.sparse_v, opt.sparse_w):
+        s0 = pow(state[0] + k, e, p)
+        rest = state[1:]
+        state = [(M00 * s0 + sum([a * b for a, b in zip(v, rest)])) % p]
+        state += [(a * s0 + b) % p for a, b in zip(w, rest)]
+
+    rest = state[1:]
+    state = [state[0]] + [
+        sum([h * x for h, x in zip(row, rest)]) % p for row in opt.matrix_H
+    ]
+
+    for i in range(last_partial, params.nRoundsF + params.nRoundsP):
+        state = full_round(state, opt.constants_C[i])
+    return state
+
+
 def poseidon(inputs, params=None, chained=False, trace=False):
     """
     Main instansiation of the Poseidon permutation
@@ -190,6 +408,10 @@ def poseidon(inputs, params=None, chained=False, trace=False):
     security level, in most cases this means you can provide `t-1` inputs with
     appropriately chosen parameters. The permutation can be 'chained' together
     to form a sponge construct.
+
+    Unless tracing, the equivalent form with sparse partial rounds from
+    `poseidon_optimize` is used, intermediate states of that differ from the
+    reference round function but the output is identical.
     """
     if params is None:
         params = DefaultParams
@@ -200,6 +422,10 @@ def poseidon(inputs, params=None, chained=False, trace=False):
         assert len(inputs) < params.t
     state = [0] * params.t
     state[: len(inputs)] = inputs
+    if not trace:
+        result = _poseidon_optimized(state, params)
+        if result is not None:
+            return result if chained else result[0]
     for i, C_i in enumerate(params.constants_C):
         state = [_ + C_i for _ in state]  # ARK(.)
         poseidon_sbox(state, i, params)
@@ -2,14 +2,18 @@
 # License: LGPL-3.0+
 
 
+import os
 import json
 import ctypes
-from functools import reduce
-from binascii import unhexlify
+import pickle
+from os import urandom
+from hashlib import sha256
 from collections import namedtuple
 
 from py_ecc import bn128
-from py_ecc.bn128 import pairing, FQ, FQ2, FQ12, neg, multiply, add
+from py_ecc.bn128 import FQ, FQ2, FQ12, neg, add, double, twist
+from py_ecc.bn128 import field_modulus, curve_order
+from py_ecc.bn128.bn128_pairing import ate_loop_count, log_ate_loop_count
 
 
 _VerifyingKeyStruct = namedtuple(
@@ -32,22 +36,13 @@ class CustomEncoder(json.JSONEncoder):
         raise RuntimeError("Unknown type", (type(o), o))
 
 
-def _bigint_bytes_to_int(x):
-    """Convert big-endian bytes to integer"""
-    return reduce(
-        lambda o, b: (o << 8) + b if isinstance(b, int) else ord(b), [0] + list(x)
-    )
-
-
 def _filter_int(x):
     """Decode an optionally hex-encoded big-endian string to a integer"""
     if isinstance(x, int):
         return x
     if x[:2] == "0x":
         x = x[2:]
-    if len(x) % 2 > 0:
-        x = "0" + x
-    return _bigint_bytes_to_int(unhexlify(x))
+    return int(x, 16) if x else 0
 
 
 def _load_g1_point(point):
@@ -84,6 +79,336 @@ def _load_g2_point(point):
     return out
 
 
+# Images of w^i under the Frobenius map x -> x^p, as FQ12 coefficients
+_FROBENIUS_BASIS = []
+
+
+def _frobenius(f, k=1):
+    """
+    Compute f^(p^k) for an FQ12 element, a linear map on its coefficients
+    """
+    if not _FROBENIUS_BASIS:
+        w_p = FQ12([0, 1] + [0] * 10) ** field_modulus
+        image = FQ12.one()
+        for _ in range(12):
+            _FROBENIUS_BASIS.append([int(c) for c in image.coeffs])
+            image = image * w_p
+    q = field_modulus
+    coeffs = [int(c) for c in f.coeffs]
+    for _ in range(k):
+        out = [0] * 12
+        for c, image in zip(coeffs, _FROBENIUS_BASIS):
+            if c:
+                for j, x in enumerate(image):
+                    out[j] += c * x
+        coeffs = [_ % q for _ in out]
+    return FQ12(coeffs)
+
+
+# The 'hard part' of the final exponent, (p^4 - p^2 + 1) / r, written in base p
+_HARD_EXPONENT = (field_modulus ** 4 - field_modulus ** 2 + 1) // curve_order
+_HARD_DIGITS = [
+    (_HARD_EXPONENT // (field_modulus ** _)) % field_modulus for _ in range(4)
+]
+
+
+def _final_exponentiate(f):
+    """
+    Raise f to (p^12 - 1) / r, as:
+
+        (p^6 - 1) * (p^2 + 1) * ((p^4 - p^2 + 1) / r)
+
+    The first two factors are Frobenius maps, the last is a simultaneous
+    exponentiation of f, f^p, f^p^2 and f^p^3 by its base p digits.
+    """
+    f = _frobenius(f, 6) / f
+    f = _frobenius(f, 2) * f
+    bases = [f]
+    for _ in range(3):
+        bases.append(_frobenius(bases[-1]))
+    table = [FQ12.one()]
+    for i, base in enumerate(bases):
+        table += [_ * base for _ in table[: 1 << i]]
+    result = FQ12.one()
+    for bit in range(max(_.bit_length() for _ in _HARD_DIGITS) - 1, -1, -1):
+        result = result * result
+        mask = sum(((d >> bit) & 1) << i for i, d in enumerate(_HARD_DIGITS))
+        if mask:
+            result = result * table[mask]
+    return result
+
+
+def _twist_coeffs(x, power):
+    """
+    Map an FQ2 element to FQ12 multiplied by w^power, as done by `twist`
+    """
+    x0, x1 = [int(_) for _ in x.coeffs]
+    coeffs = [0] * 12
+    coeffs[power] = x0 - 9 * x1
+    coeffs[power + 6] = x1
+    return FQ12(coeffs)
+
+
+def _line_coeffs(R, S):
+    """
+    Coefficients `(m, c)` of the line through R and S (the tangent if R == S),
+    which evaluates at a point T as `m * T.x - T.y + c`. For a vertical line `m`
+    is None and it evaluates as `T.x + c`.
+    """
+    x1, y1 = R
+    x2, y2 = S
+    if x1 != x2:
+        m = (y2 - y1) / (x2 - x1)
+    elif y1 == y2:
+        m = 3 * x1 ** 2 / (2 * y1)
+    else:
+        return (None, -x1)
+    return (m, y1 - m * x1)
+
+
+def _line_eval(line, P):
+    m, c = line
+    if m is None:
+        return P[0] + c
+    return m * P[0].coeffs[0] - P[1] + c
+
+
+# For each line of the Miller loop, whether the accumulator is squared first
+_MILLER_SQUARINGS = []
+for _i in range(log_ate_loop_count, -1, -1):
+    _MILLER_SQUARINGS.append(True)
+    if ate_loop_count & (2 ** _i):
+        _MILLER_SQUARINGS.append(False)
+_MILLER_SQUARINGS += [False, False]
+
+
+def _twisted_line_coeffs(R, S):
+    """
+    `_line_coeffs` of the twisted points, computed from the points on the twist
+
+    The twist maps (x, y) to (x' * w^2, y' * w^3), so the slope of the twisted
+    line is m' * w and its constant is (y' - m' * x') * w^3. The arithmetic is
+    done in FQ2, and only the results are mapped to FQ12.
+    """
+    x1, y1 = R
+    x2, y2 = S
+    if x1 != x2:
+        m = (y2 - y1) / (x2 - x1)
+    elif y1 == y2:
+        m = 3 * x1 ** 2 / (2 * y1)
+    else:
+        return (None, -_twist_coeffs(x1, 2))
+    return (_twist_coeffs(m, 1), _twist_coeffs(y1 - m * x1, 3))
+
+
+def _miller_lines(Q):
+    """
+    Line coefficients of the optimal ate Miller loop for a G2 point, these only
+    depend on the G2 point and can be computed once for fixed points.
+    """
+    R = Q
+    lines = []
+    for i in range(log_ate_loop_count, -1, -1):
+        lines.append(_twisted_line_coeffs(R, R))
+        R = double(R)
+        if ate_loop_count & (2 ** i):
+            lines.append(_twisted_line_coeffs(R, Q))
+            R = add(R, Q)
+    R = twist(R)
+    Q = twist(Q)
+    Q1 = (_frobenius(Q[0]), _frobenius(Q[1]))
+    nQ2 = (_frobenius(Q1[0]), -_frobenius(Q1[1]))
+    lines.append(_line_coeffs(R, Q1))
+    R = add(R, Q1)
+    lines.append(_line_coeffs(R, nQ2))
+    return lines
+
+
+def _miller_loop_multi(pairs):
+    """
+    Product of the Miller loops for `(lines, P)` pairs, where `lines` are from
+    `_miller_lines` and P is a G1 point, sharing the squarings between them.
+
+    The final exponentiation is not applied.
+    """
+    pairs = [
+        (lines, (FQ12([P[0].n] + [0] * 11), FQ12([P[1].n] + [0] * 11)))
+        for lines, P in pairs
+        if lines is not None and P is not None
+    ]
+    f = FQ12.one()
+    for i, square in enumerate(_MILLER_SQUARINGS):
+        if square:
+            f = f * f
+        for lines, P in pairs:
+            f = f * _line_eval(lines[i], P)
+    return f
+
+
+# Raw integer arithmetic on G1, in Jacobian coordinates (X, Y, Z) representing
+# the affine point (X/Z^2, Y/Z^3), where Z = 0 is the point at infinity
+_G1_INFINITY = (1, 1, 0)
+
+
+def _g1_jacobian(P):
+    if P is None:
+        return _G1_INFINITY
+    return (P[0].n, P[1].n, 1)
+
+
+def _g1_affine(P):
+    if P[2] == 0:
+        return None
+    q = field_modulus
+    inv_z = pow(P[2], q - 2, q)
+    inv_z2 = (inv_z * inv_z) % q
+    return (FQ((P[0] * inv_z2) % q), FQ((P[1] * inv_z2 * inv_z) % q))
+
+
+def _g1_double(P):
+    X1, Y1, Z1 = P
+    if Z1 == 0 or Y1 == 0:
+        return _G1_INFINITY
+    q = field_modulus
+    A = (X1 * X1) % q
+    B = (Y1 * Y1) % q
+    C = (B * B) % q
+    D = (2 * ((X1 + B) ** 2 - A - C)) % q
+    E = 3 * A
+    F = (E * E) % q
+    X3 = (F - 2 * D) % q
+    return (X3, (E * (D - X3) - 8 * C) % q, (2 * Y1 * Z1) % q)
+
+
+def _g1_add(P, Q):
+    X1, Y1, Z1 = P
+    X2, Y2, Z2 = Q
+    if Z1 == 0:
+        return Q
+    if Z2 == 0:
+        return P
+    q = field_modulus
+    Z1Z1 = (Z1 * Z1) % q
+    Z2Z2 = (Z2 * Z2) % q
+    U1 = (X1 * Z2Z2) % q
+    U2 = (X2 * Z1Z1) % q
+    S1 = (Y1 * Z2 * Z2Z2) % q
+    S2 = (Y2 * Z1 * Z1Z1) % q
+    H = (U2 - U1) % q
+    r = (2 * (S2 - S1)) % q
+    if H == 0:
+        return _g1_double(P) if r == 0 else _G1_INFINITY
+    I = (4 * H * H) % q
+    J = (H * I) % q
+    V = (U1 * I) % q
+    X3 = (r * r - J - 2 * V) % q
+    Y3 = (r * (V - X3) - 2 * S1 * J) % q
+    Z3 = (((Z1 + Z2) ** 2 - Z1Z1 - Z2Z2) * H) % q
+    return (X3, Y3, Z3)
+
+
+def _g1_normalize(points):
+    """
+    Convert Jacobian points to Z = 1, sharing one inversion between all of them
+    """
+    q = field_modulus
+    products = []
+    acc = 1
+    for P in points:
+        products.append(acc)
+        if P[2] != 0:
+            acc = (acc * P[2]) % q
+    inv = pow(acc, q - 2, q)
+    out = [None] * len(points)
+    for i in range(len(points) - 1, -1, -1):
+        X, Y, Z = points[i]
+        if Z == 0:
+            out[i] = _G1_INFINITY
+            continue
+        inv_z = (inv * products[i]) % q
+        inv = (inv * Z) % q
+        inv_z2 = (inv_z * inv_z) % q
+        out[i] = ((X * inv_z2) % q, (Y * inv_z2 * inv_z) % q, 1)
+    return out
+
+
+def _g1_mult(P, scalar, width=4):
+    """
+    Multiply a G1 point by a scalar, with a fixed window of `width` bits
+    """
+    scalar %= curve_order
+    multiples = [_G1_INFINITY, _g1_jacobian(P)]
+    for _ in range((1 << width) - 2):
+        multiples.append(_g1_add(multiples[-1], multiples[1]))
+    result = _G1_INFINITY
+    mask = (1 << width) - 1
+    top = ((scalar.bit_length() - 1) // width) * width
+    for shift in range(top, -1, -width):
+        for _ in range(width):
+            result = _g1_double(result)
+        result = _g1_add(result, multiples[(scalar >> shift) & mask])
+    return _g1_affine(result)
+
+
+class G1FixedBaseTable(object):
+    """
+    Multiples of a fixed G1 point for every `width` bit window of a scalar:
+
+        rows[j][d - 1] = d * 2^(width*j) * point
+
+    Multiplying by a scalar is then one addition per non-zero window, and no
+    doublings, which makes multi-scalar multiplications with fixed points a
+    sum of table entries.
+    """
+
+    def __init__(self, point, width=4, nbits=curve_order.bit_length()):
+        self.width = width
+        rows = []
+        current = _g1_jacobian(point)
+        for _ in range((nbits + width - 1) // width):
+            row = [current]
+            for _ in range((1 << width) - 1):
+                row.append(_g1_add(row[-1], current))
+            # The last entry is 2^width * current, the base of the next row
+            current = row.pop()
+            rows.append(row)
+        flat = _g1_normalize(sum(rows, []))
+        size = (1 << width) - 1
+        self.rows = [flat[i : i + size] for i in range(0, len(flat), size)]
+
+    def _mult_add(self, scalar, acc):
+        scalar %= curve_order
+        mask = (1 << self.width) - 1
+        for row in self.rows:
+            if not scalar:
+                break
+            digit = scalar & mask
+            if digit:
+                acc = _g1_add(acc, row[digit - 1])
+            scalar >>= self.width
+        return acc
+
+    def mult(self, scalar):
+        return _g1_affine(self._mult_add(scalar, _G1_INFINITY))
+
+
+def _g1_fixed_base_msm(tables, scalars):
+    """
+    Sum of `scalars[i] * tables[i].point`, for `G1FixedBaseTable`s
+    """
+    acc = _G1_INFINITY
+    for table, scalar in zip(tables, scalars):
+        acc = table._mult_add(scalar, acc)
+    return _g1_affine(acc)
+
+
+def _check_pairing_input(p1, p2):
+    if not bn128.is_on_curve(p2, bn128.b2):
+        raise ValueError("Invalid input - point Q is not on the correct curve")
+    if not bn128.is_on_curve(p1, bn128.b):
+        raise ValueError("Invalid input - point P is not on the correct curves")
+
+
 def pairingProd(*inputs):
     """
     The Ethereum pairing opcode works like:
@@ -92,12 +417,16 @@ def pairingProd(*inputs):
 
     See: EIP 212
 
+    The Miller loops share their squarings, and a single final exponentiation is
+    applied to their product.
+
     >>> assert True == pairingProd((G1, G2), (G1, neg(G2)))
     """
-    product = FQ12.one()
+    pairs = []
     for p1, p2 in inputs:
-        product *= pairing(p2, p1)
-    return product == FQ12.one()
+        _check_pairing_input(p1, p2)
+        pairs.append((_miller_lines(p2) if p2 is not None else None, p1))
+    return _final_exponentiate(_miller_loop_multi(pairs)) == FQ12.one()
 
 
 class BaseProof(object):
@@ -182,37 +511,281 @@ class VerifyingKey(BaseVerifier, _VerifyingKeyStruct):
     G2_POINTS = ["beta", "gamma", "delta"]
     G1_LISTS = ["gammaABC"]
 
+    def prepare(self):
+        """Key with the pairing work which only depends on the key precomputed"""
+        prepared = self.__dict__.get("_prepared")
+        if prepared is None:
+            prepared = self.__dict__["_prepared"] = PreparedVerifyingKey(self)
+        return prepared
+
     def verify(self, proof):
         """Verify if a proof is correct for the given inputs"""
+        return self.prepare().verify(proof)
+
+    def verify_batch(self, proofs):
+        """Verify many proofs at once, returns a list with the result of each"""
+        return self.prepare().verify_batch(proofs)
+
+
+def _coeff_ints(x):
+    """Integers of a G1 point, or the coefficients of an extension field element"""
+    return [int(_) for _ in (x.coeffs if hasattr(x, "coeffs") else x)]
+
+
+def _lines_ints(lines):
+    return [(None if m is None else _coeff_ints(m), _coeff_ints(c)) for m, c in lines]
+
+
+def _lines_from_ints(lines):
+    return [(None if m is None else FQ12(m), FQ12(c)) for m, c in lines]
+
+
+class PreparedVerifyingKey(object):
+    """
+    Verifying key with the Miller loop lines of gamma and delta precomputed, and
+    the Miller loop of the fixed e(-alpha, beta) term already evaluated. The
+    `gammaABC` points have fixed-base tables, for computing vk_x.
+
+    Verifying a proof then runs one multi-Miller loop over the three remaining
+    pairs, computing lines only for the proof's B, and a single final
+    exponentiation.
+    """
+
+    def __init__(self, vk):
+        self.vk = vk
+        self.gamma_lines = _miller_lines(vk.gamma)
+        self.delta_lines = _miller_lines(vk.delta)
+        self.beta_lines = _miller_lines(vk.beta)
+        self.alpha_beta = _miller_loop_multi([(self.beta_lines, neg(vk.alpha))])
+        self.gammaABC_tables = [G1FixedBaseTable(_) for _ in vk.gammaABC]
+
+    def __getstate__(self):
+        # py_ecc field elements can't be pickled, so everything is stored as integers
+        vk = self.vk
+        return dict(
+            vk=dict(
+                alpha=_coeff_ints(vk.alpha),
+                beta=[_coeff_ints(_) for _ in vk.beta],
+                gamma=[_coeff_ints(_) for _ in vk.gamma],
+                delta=[_coeff_ints(_) for _ in vk.delta],
+                gammaABC=[_coeff_ints(_) for _ in vk.gammaABC],
+            ),
+            gamma_lines=_lines_ints(self.gamma_lines),
+            delta_lines=_lines_ints(self.delta_lines),
+            beta_lines=_lines_ints(self.beta_lines),
+            alpha_beta=_coeff_ints(self.alpha_beta),
+            gammaABC_tables=[(_.width, _.rows) for _ in self.gammaABC_tables],
+        )
+
+    def __setstate__(self, state):
+        vk = state["vk"]
+        self.vk = VerifyingKey(
+            tuple(FQ(_) for _ in vk["alpha"]),
+            tuple(FQ2(_) for _ in vk["beta"]),
+            tuple(FQ2(_) for _ in vk["gamma"]),
+            tuple(FQ2(_) for _ in vk["delta"]),
+            [tuple(FQ(_) for _ in P) for P in vk["gammaABC"]],
+        )
+        self.vk.__dict__["_prepared"] = self
+        self.gamma_lines = _lines_from_ints(state["gamma_lines"])
+        self.delta_lines = _lines_from_ints(state["delta_lines"])
+        self.beta_lines = _lines_from_ints(state["beta_lines"])
+        self.alpha_beta = FQ12(state["alpha_beta"])
+        self.gammaABC_tables = []
+        for width, rows in state["gammaABC_tables"]:
+            table = G1FixedBaseTable.__new__(G1FixedBaseTable)
+            table.width, table.rows = width, rows
+            self.gammaABC_tables.append(table)
+
+    def _vk_x(self, inputs, c0=1):
+        """
+        Compute the linear combination vk_x
+
+            vk_x = c0*gammaABC[0] + gammaABC[1]^x[0] + ... + gammaABC[n+1]^x[n]
+        """
+        if len(inputs) >= len(self.gammaABC_tables):
+            raise ValueError("Too many inputs for verifying key")
+        return _g1_fixed_base_msm(self.gammaABC_tables, [c0] + list(inputs))
+
+    def _check_proof(self, proof):
         if not isinstance(proof, Proof):
             raise TypeError("Invalid proof type")
+        # The key's points were validated when it was loaded, only check the proof's
+        _check_pairing_input(proof.A, proof.B)
+        if not bn128.is_on_curve(proof.C, bn128.b):
+            raise ValueError("Invalid input - point C is not on the correct curve")
 
-        # Compute the linear combination vk_x
-        # vk_x = gammaABC[0] + gammaABC[1]^x[0] + ... + gammaABC[n+1]^x[n]
-        vk_x = self.gammaABC[0]
-        for i, x in enumerate(proof.input):
-            vk_x = add(vk_x, multiply(self.gammaABC[i + 1], x))
+    def _has_valid_arity(self, proof):
+        return len(proof.input) < len(self.gammaABC_tables)
+
+    def verify(self, proof):
+        """
+        Verify if a proof is correct for the given inputs, proofs with more inputs
+        than the key accepts are invalid
+        """
+        self._check_proof(proof)
+        if not self._has_valid_arity(proof):
+            return False
+        vk_x = self._vk_x(proof.input)
 
         # e(B, A) * e(gamma, -vk_x) * e(delta, -C) * e(beta, -alpha)
-        return pairingProd(
-            (proof.A, proof.B),
-            (neg(vk_x), self.gamma),
-            (neg(proof.C), self.delta),
-            (neg(self.alpha), self.beta),
+        f = _miller_loop_multi(
+            [
+                (_miller_lines(proof.B) if proof.B is not None else None, proof.A),
+                (self.gamma_lines, neg(vk_x)),
+                (self.delta_lines, neg(proof.C)),
+            ]
         )
+        return _final_exponentiate(f * self.alpha_beta) == FQ12.one()
+
+    def verify_batch(self, proofs):
+        """
+        Verify many proofs, with random 128-bit weights r_i they are all accepted
+        when:
 
+            prod(e(B_i, r_i*A_i)) * e(gamma, -sum(r_i*vk_x_i))
+                * e(delta, -sum(r_i*C_i)) * e(beta, -sum(r_i)*alpha) == 1
 
-class NativeVerifier(VerifyingKey):
-    def verify(self, proof, native_library_path):
-        if not isinstance(proof, Proof):
-            raise TypeError("Invalid proof type")
+        Which is N+3 pairings, sharing one final exponentiation. The sum of the
+        vk_x terms is a single linear combination of `gammaABC`. When the check
+        fails the proofs are split in half and each half checked again, until
+        the invalid proofs are found.
 
-        vk_cstr = ctypes.c_char_p(self.to_json().encode("ascii"))
-        proof_cstr = ctypes.c_char_p(proof.to_json().encode("ascii"))
+        The weighted terms of each proof are computed once and shared by every
+        check it is part of. Proofs with more inputs than the key accepts are
+        invalid, as with `verify` they are given a False result and left out of
+        the combined check.
 
+        Returns a list with the result for each proof
+        """
+        proofs = list(proofs)
+        for proof in proofs:
+            self._check_proof(proof)
+        valid = [i for i, _ in enumerate(proofs) if self._has_valid_arity(_)]
+        result = [False] * len(proofs)
+        checked = self._verify_bisect([self._batch_terms(proofs[i]) for i in valid])
+        for i, ok in zip(valid, checked):
+            result[i] = ok
+        return result
+
+    @staticmethod
+    def _batch_terms(proof):
+        """
+        Terms of one proof in the combined check: `(r, B lines, r*A, r*C, r*inputs)`
+        """
+        # Non-zero, so a check of a single proof is equivalent to `verify`
+        r = 1 + int.from_bytes(urandom(16), "little")
+        B_lines = _miller_lines(proof.B) if proof.B is not None else None
+        inputs = [(r * x) % curve_order for x in proof.input]
+        return r, B_lines, _g1_mult(proof.A, r), _g1_mult(proof.C, r), inputs
+
+    def _verify_bisect(self, terms, failed=False):
+        """
+        Results for the proofs of `terms`, where `failed` means their combined
+        check is already known to fail
+        """
+        if not terms:
+            return []
+        if not failed and self._verify_combined(terms):
+            return [True] * len(terms)
+        if len(terms) == 1:
+            return [False]
+        half = len(terms) // 2
+        first = self._verify_bisect(terms[:half])
+        # When the first half is valid, the invalid proofs are in the second half
+        return first + self._verify_bisect(terms[half:], all(first))
+
+    def _verify_combined(self, terms):
+        inputs = [0] * max(len(_[4]) for _ in terms)
+        r_sum = 0
+        C_sum = None
+        pairs = []
+        for r, B_lines, rA, rC, r_inputs in terms:
+            r_sum += r
+            for i, x in enumerate(r_inputs):
+                inputs[i] += x
+            C_sum = add(C_sum, rC)
+            pairs.append((B_lines, rA))
+        r_sum %= curve_order
+        vk_x = self._vk_x([_ % curve_order for _ in inputs], r_sum)
+        pairs += [
+            (self.gamma_lines, neg(vk_x)),
+            (self.delta_lines, neg(C_sum)),
+            (self.beta_lines, neg(_g1_mult(self.vk.alpha, r_sum))),
+        ]
+        return _final_exponentiate(_miller_loop_multi(pairs)) == FQ12.one()
+
+
+# Directory of pickled prepared keys, used by `load_prepared_key` when set
+VK_CACHE_DIR_ENV = "ETHSNARKS_VK_CACHE_DIR"
+
+# Prepared keys, keyed by the SHA-256 of their JSON file
+_PREPARED_KEYS = dict()
+
+
+def load_prepared_key(filename, cache_dir=None):
+    """
+    Load a verifying key file, returning a `PreparedVerifyingKey`
+
+    Keys are cached by the hash of the file contents, so loading the same key
+    again only costs reading and hashing the file. With a `cache_dir` (or the
+    ETHSNARKS_VK_CACHE_DIR environment variable) prepared keys are also pickled
+    there, so other processes skip parsing, validating and preparing the key.
+    The cache directory must only be writable by trusted users.
+    """
+    with open(filename, "rb") as handle:
+        data = handle.read()
+    digest = sha256(data).hexdigest()
+    prepared = _PREPARED_KEYS.get(digest)
+    if prepared is not None:
+        return prepared
+
+    cache_dir = cache_dir or os.getenv(VK_CACHE_DIR_ENV)
+    cache_file = os.path.join(cache_dir, digest + ".pickle") if cache_dir else None
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file, "rb") as handle:
+            prepared = pickle.load(handle)
+    else:
+        prepared = VerifyingKey.from_dict(json.loads(data)).prepare()
+        if cache_file:
+            # Written to a temporary file first, so readers never see a partial one
+            tmp_file = "%s.%d.tmp" % (cache_file, os.getpid())
+            try:
+                with open(tmp_file, "wb") as handle:
+                    pickle.dump(prepared, handle, pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_file, cache_file)
+            finally:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+    _PREPARED_KEYS[digest] = prepared
+    return prepared
+
+
+# Verify functions of loaded native libraries, keyed by path
+_NATIVE_VERIFY = dict()
+
+
+def _native_verify_func(native_library_path):
+    lib_verify = _NATIVE_VERIFY.get(native_library_path)
+    if lib_verify is None:
         lib = ctypes.cdll.LoadLibrary(native_library_path)
         lib_verify = lib.ethsnarks_verify
         lib_verify.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
         lib_verify.restype = ctypes.c_bool
+        _NATIVE_VERIFY[native_library_path] = lib_verify
+    return lib_verify
+
+
+class NativeVerifier(VerifyingKey):
+    def verify(self, proof, native_library_path):
+        if not isinstance(proof, Proof):
+            raise TypeError("Invalid proof type")
+
+        # The key is only serialized once
+        vk_json = self.__dict__.get("_json")
+        if vk_json is None:
+            vk_json = self.__dict__["_json"] = self.to_json().encode("ascii")
+        vk_cstr = ctypes.c_char_p(vk_json)
+        proof_cstr = ctypes.c_char_p(proof.to_json().encode("ascii"))
 
-        return lib_verify(vk_cstr, proof_cstr)
+        return _native_verify_func(native_library_path)(vk_cstr, proof_cstr)
@@ -8,7 +8,7 @@ from typing import Any, Callable, Union
 
 import requests
 
-from ethsnarks.eddsa import PoseidonEdDSA
+from ethsnarks.eddsa import EdDSASigner, PoseidonEdDSA
 from ethsnarks.field import FQ, SNARK_SCALAR_FIELD
 from ethsnarks.poseidon.permutation import poseidon, poseidon_params
 
@@ -121,6 +121,7 @@ class LoopringClient:
         self.api_key = account["apiKey"]
         self.exchangeId = account["exchangeId"]
         self.private_key = account["privateKey"].encode()
+        self._signer = None
         self.address = account["accountAddress"]
         self.accountId = account["accountId"]
         self.publicKeyX = ""
@@ -136,6 +137,13 @@ class LoopringClient:
         for token_id in [info["tokenId"] for info in market_info_map.values()]:
             self.query_orderId(token_id)
 
+    @property
+    def signer(self):
+        # Validating the key and deriving the public key is only done once
+        if self._signer is None:
+            self._signer = EdDSASigner(FQ(int(self.private_key)), PoseidonEdDSA)
+        return self._signer
+
     def get_full_url(self, path: str):
         return self.url_base + path
 
@@ -175,7 +183,7 @@ class LoopringClient:
             hasher = hashlib.sha256()
             hasher.update(ordered_data.encode("utf-8"))
             msgHash = int(hasher.hexdigest(), 16) % SNARK_SCALAR_FIELD
-            signed = PoseidonEdDSA.sign(msgHash, FQ(int(self.private_key)))
+            signed = self.signer.sign(msgHash)
             signature = ",".join(
                 str(_) for _ in [signed.sig.R.x, signed.sig.R.y, signed.sig.s]
             )
@@ -323,7 +331,7 @@ class LoopringClient:
 
         order_message = self._serialize_order(order)
         msgHash = poseidon(order_message, self.order_sign_param)
-        signedMessage = PoseidonEdDSA.sign(msgHash, FQ(int(self.private_key)))
+        signedMessage = self.signer.sign(msgHash)
 
         order.update(
             {